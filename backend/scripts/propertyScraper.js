@@ -11,6 +11,34 @@ const { pgPool } = require('../config/db');
 const CRAWL4AI_SERVICE_URL = process.env.CRAWL4AI_SERVICE_URL;
 const MAX_RETRIES = 3; // Number of retry attempts
 const RETRY_DELAY = 2000; // Delay between retries in milliseconds
+const REQUEST_TIMEOUT = 120000; // Timeout for a single-page call to the Crawl4AI service, in milliseconds
+const BATCH_MAX_URLS = 100; // URLs per /scrape/batch call (must not exceed the service's BATCH_MAX_URLS)
+const BATCH_TIMEOUT = 600000; // Timeout for one /scrape/batch call, in milliseconds
+
+// Generic prompt used for property detail pages when no source-specific prompt is given
+const DEFAULT_DETAIL_PROMPT = `
+      Scrape this real estate property detail page.
+      Extract the following information:
+      - Full street address (as 'address')
+      - City (as 'city')
+      - State (as 'state')
+      - Zip code (as 'zip')
+      - Listed price (as 'price')
+      - Number of bedrooms (as 'bedrooms')
+      - Number of bathrooms (as 'bathrooms')
+      - Square footage (as 'squareFootage')
+      - Year built (as 'yearBuilt')
+      - Lot size (as 'lotSize')
+      - Property type (e.g., 'Single Family', 'Condo') (as 'propertyType')
+      - HOA fees (if available, per month or year) (as 'hoaFees')
+      - Property tax information (if available) (as 'taxInfo')
+      - A detailed description of the property (as 'description')
+      - List of image URLs (as 'images', should be a list of strings)
+      - List of property features or amenities (as 'features', should be a list of strings)
+      - The source website or MLS name (as 'source')
+      Return the result as a single JSON object.
+      Example: {"address": "123 Main St", "city": "Anytown", "state": "CA", "zip": "12345", "price": "$500,000", ...}
+    `;
 
 // Add a check to ensure the variable is set
 if (!CRAWL4AI_SERVICE_URL) {
@@ -138,7 +166,7 @@ class PropertyScraper {
     for (let attempt = 1; attempt <= MAX_RETRIES; attempt++) {
       try {
         console.log(`Attempt ${attempt}/${MAX_RETRIES} for ${url}...`);
-        const response = await axios.post(targetUrl, postData);
+        const response = await axios.post(targetUrl, postData, { timeout: REQUEST_TIMEOUT });
 
         // Log raw response data for debugging
         console.log(`[Debug] Raw response from Crawl4AI service (Attempt ${attempt}):`, JSON.stringify(response.data, null, 2));
@@ -249,30 +277,8 @@ class PropertyScraper {
   async scrapePropertyDetails(url, detailPrompt) {
     console.log(`Scraping property details from: ${url}`);
 
-    // Define a generic prompt or use the one provided
-    const prompt = detailPrompt || `
-      Scrape this real estate property detail page.
-      Extract the following information:
-      - Full street address (as 'address')
-      - City (as 'city')
-      - State (as 'state')
-      - Zip code (as 'zip')
-      - Listed price (as 'price')
-      - Number of bedrooms (as 'bedrooms')
-      - Number of bathrooms (as 'bathrooms')
-      - Square footage (as 'squareFootage')
-      - Year built (as 'yearBuilt')
-      - Lot size (as 'lotSize')
-      - Property type (e.g., 'Single Family', 'Condo') (as 'propertyType')
-      - HOA fees (if available, per month or year) (as 'hoaFees')
-      - Property tax information (if available) (as 'taxInfo')
-      - A detailed description of the property (as 'description')
-      - List of image URLs (as 'images', should be a list of strings)
-      - List of property features or amenities (as 'features', should be a list of strings)
-      - The source website or MLS name (as 'source')
-      Return the result as a single JSON object.
-      Example: {"address": "123 Main St", "city": "Anytown", "state": "CA", "zip": "12345", "price": "$500,000", ...}
-    `;
+    // Use the generic detail prompt unless a specific one is provided
+    const prompt = detailPrompt || DEFAULT_DETAIL_PROMPT;
 
     try {
         const extractedData = await this.callCrawl4aiService(url, prompt);
@@ -294,6 +300,41 @@ class PropertyScraper {
     }
   }
 
+  /**
+   * Scrape detailed property data for many listing URLs in one call to the
+   * Crawl4AI service's /scrape/batch endpoint (crawled concurrently server-side).
+   * @param {string[]} urls - Property listing URLs
+   * @param {string} detailPrompt - Optional prompt specific to detail scraping
+   * @returns {Promise<Map<string, {data: Object|null, error: string|null}>>} - Result per URL
+   */
+  async scrapePropertyDetailsBatch(urls, detailPrompt) {
+    const results = new Map();
+    if (!urls || urls.length === 0) {
+      return results;
+    }
+    console.log(`Scraping property details for ${urls.length} URLs via batch endpoint`);
+    const targetUrl = `${this.crawl4aiServiceUrl}/scrape/batch`;
+    let succeeded = 0;
+
+    // The service rejects batches larger than BATCH_MAX_URLS, so long lists are sent in several calls
+    for (let start = 0; start < urls.length; start += BATCH_MAX_URLS) {
+      const postData = { urls: urls.slice(start, start + BATCH_MAX_URLS), prompt: detailPrompt || DEFAULT_DETAIL_PROMPT };
+      const response = await axios.post(targetUrl, postData, { timeout: BATCH_TIMEOUT });
+      for (const item of response.data?.results || []) {
+        const extractedData = item.data;
+        if (item.success && !item.error && extractedData && typeof extractedData === 'object' && !Array.isArray(extractedData)) {
+          extractedData.scrapedUrl = item.url;
+          results.set(item.url, { data: extractedData, error: null });
+        } else {
+          results.set(item.url, { data: null, error: item.error || 'Expected an object with property details from Crawl4AI service.' });
+        }
+      }
+      succeeded += response.data?.succeeded ?? 0;
+    }
+    console.log(`Batch detail scrape finished: ${succeeded}/${urls.length} succeeded`);
+    return results;
+  }
+
   /**
    * Save property data to database
    * @param {Object} propertyData - Property data to save
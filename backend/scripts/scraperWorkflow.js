@@ -131,6 +131,27 @@ ${JSON.stringify(this.extractionTemplate, null, 2)}
       let failedItems = 0;
       let skippedItems = 0; // Added counter for skipped duplicates
 
+      // Resolve detail URLs up front and fetch all detail pages in one batch call
+      // (the Python service crawls them concurrently instead of one round trip per listing)
+      const resolveDetailUrl = (listingUrl) => {
+        // Construct absolute URL if needed (e.g., for bookstoscrape)
+        if (source === 'bookstoscrape-test' && !listingUrl.startsWith('http')) {
+          // Assuming the base URL is known or can be derived/passed
+          const baseUrl = 'http://books.toscrape.com/'; // Define base URL
+          // Avoid double slashes if listing.url starts with /catalogue...
+          return new URL(listingUrl.startsWith('/') ? listingUrl.substring(1) : listingUrl, baseUrl).href;
+        }
+        return listingUrl;
+      };
+      let prefetchedDetails = new Map();
+      const detailUrls = listings.filter(listing => listing && listing.url).map(listing => resolveDetailUrl(listing.url));
+      try {
+        prefetchedDetails = await this.propertyScraper.scrapePropertyDetailsBatch([...new Set(detailUrls)]);
+      } catch (batchError) {
+        // Fall back to per-listing scraping below
+        console.warn(`[DEBUG] Batch detail scrape failed, falling back to per-listing scraping: ${batchError.message}`);
+      }
+
       // Process each listing (if any)
       for (const listing of listings) {
         // Basic check for a URL before proceeding
@@ -142,18 +163,16 @@ ${JSON.stringify(this.extractionTemplate, null, 2)}
         try {
           processedItems++;
 
-          // Construct absolute URL if needed (e.g., for bookstoscrape)
-          let detailUrl = listing.url;
-          if (source === 'bookstoscrape-test' && !detailUrl.startsWith('http')) {
-              // Assuming the base URL is known or can be derived/passed
-              const baseUrl = 'http://books.toscrape.com/'; // Define base URL
-              // Avoid double slashes if listing.url starts with /catalogue...
-              detailUrl = new URL(detailUrl.startsWith('/') ? detailUrl.substring(1) : detailUrl, baseUrl).href;
-              console.log(`[DEBUG] Constructed absolute URL for ${source}: ${detailUrl}`);
-          }
+          const detailUrl = resolveDetailUrl(listing.url);
 
-          // Scrape detailed property data (assuming scrapePropertyDetails exists and works)
-          const propertyDetails = await this.propertyScraper.scrapePropertyDetails(detailUrl); // Use potentially modified detailUrl
+          // Use the batch-fetched details when available, otherwise scrape this page on its own (with retries)
+          const prefetched = prefetchedDetails.get(detailUrl);
+          if (prefetched && prefetched.error) {
+            console.warn(`[DEBUG] Batch detail scrape failed for ${detailUrl}, retrying individually: ${prefetched.error}`);
+          }
+          const propertyDetails = prefetched && prefetched.data
+            ? prefetched.data
+            : await this.propertyScraper.scrapePropertyDetails(detailUrl); // Use potentially modified detailUrl
 
           // --- Check for existing property using listing_url ---
           try {
@@ -0,0 +1,140 @@
+"""
+Local HTTP server that replays recorded pages, so benchmarks don't depend on live sites.
+
+Routes (query strings are ignored, so load generators can make every URL unique to defeat caches):
+  /listing         server-rendered listing page (fixtures/listing.html)
+  /detail/<id>     detail page (fixtures/detail.html with {{id}} filled in)
+  /heavy           the listing page padded with inline scripts, styles, tracking pixels and images (~1.5 MB)
+  /js-listing      listing rendered client-side by JavaScript (forces the browser path)
+  /page/<name>     any other recorded page, fixtures/<name>.html as-is
+Responses carry an ETag and answer a matching If-None-Match with 304.
+
+Run standalone:     python -m benchmarks.fixture_server --port 8089
+Record a live page: python -m benchmarks.fixture_server --record https://example.com/listing my_listing
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, f"{name}.html"), encoding="utf-8") as f:
+        return f.read()
+
+
+def build_heavy_page(listing_html: str, padding_blocks: int = 400) -> str:
+    """The listing page bloated the way real portals are: analytics scripts, inline CSS, SVG icons and images."""
+    noise = []
+    for i in range(padding_blocks):
+        noise.append(
+            f'<script>window.__analytics = window.__analytics || []; window.__analytics.push({{"event": "impression", "slot": {i}, '
+            f'"payload": "{"x" * 3500}"}});</script>'
+            f'<style>.promo-{i} {{ margin: {i % 7}px; background: url(/img/promo-{i}.png); }}</style>'
+            f'<div class="promo promo-{i}"><svg width="16" height="16"><path d="M0 0 L16 16 L0 16 Z"/></svg>'
+            f'<img src="https://doubleclick.net/pixel?slot={i}" width="1" height="1"></div>'
+        )
+    return listing_html.replace("</body>", "\n".join(noise) + "\n</body>")
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    pages: dict[str, str] = {}
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _page_for(self, path: str) -> str | None:
+        if path in ("/", "/listing"):
+            return self.pages["listing"]
+        if path == "/heavy":
+            return self.pages["heavy"]
+        if path == "/js-listing":
+            return self.pages["js_listing"]
+        match = re.fullmatch(r"/detail/([\w-]+)", path)
+        if match:
+            return self.pages["detail"].replace("{{id}}", match.group(1))
+        match = re.fullmatch(r"/page/([\w-]+)", path)
+        if match:
+            try:
+                return load_fixture(match.group(1))
+            except FileNotFoundError:
+                return None
+        return None
+
+    def do_GET(self):
+        body = self._page_for(urlsplit(self.path).path)
+        if body is None:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        etag = '"' + hashlib.sha256(payload).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_fixture_server(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Starts the server on a daemon thread; port 0 picks a free port (see server.server_port)."""
+    listing = load_fixture("listing")
+    FixtureHandler.pages = {
+        "listing": listing,
+        "detail": load_fixture("detail"),
+        "js_listing": load_fixture("js_listing"),
+        "heavy": build_heavy_page(listing),
+    }
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Fixture server listening on http://{host}:{server.server_port}")
+    return server
+
+
+def record(url: str, name: str):
+    """Saves a live page as fixtures/<name>.html so it can be replayed at /page/<name>."""
+    request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0 (benchmark fixture recorder)"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        html = response.read().decode(response.headers.get_content_charset() or "utf-8", errors="replace")
+    path = os.path.join(FIXTURES_DIR, f"{name}.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(html)
+    print(f"Recorded {url} ({len(html)} chars) to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded pages for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--record", nargs=2, metavar=("URL", "NAME"), help="Record a live page into fixtures/ and exit.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.record:
+        record(*args.record)
+        return
+    start_fixture_server(args.host, args.port)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Offline load benchmark for the scrape service.
+
+Starts the fixture server and the stub LLM, launches the service (`uvicorn main:app`) pointed at them
+(or uses an already running one with --service-url), then drives /scrape for every combination of
+extraction mode (schema, llm), page kind (listing, detail, heavy, js) and concurrency level.
+Each scenario reports throughput, p50/p95/p99 latency, errors and peak service/browser memory
+(sampled from /metrics). Results are written to data/benchmarks/<timestamp>.json and compared
+with the previous run; scenarios whose p95 or throughput got worse than --regression-threshold are flagged.
+
+With --service-url the running service must already point at the stub LLM (LLM_PROVIDER, LLM_BASE_URL,
+GEMINI_API_ENDPOINT, see start_service) started on a fixed --stub-port. The JS page is served from
+localhost and the others from 127.0.0.1 (see PAGE_HOSTS); a running service keeps the fetch modes it
+learned for those hosts across runs.
+
+Run from crawl4ai-service/:
+  python -m benchmarks.run_benchmark
+  python -m benchmarks.run_benchmark --modes schema --pages listing,heavy --concurrency 1,8 --requests 40
+  python -m benchmarks.run_benchmark --llm-latency-ms 1500 --label slow-llm --fail-on-regression
+"""
+import argparse
+import asyncio
+import glob
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fixture_server import start_fixture_server
+from benchmarks.stub_llm import start_stub_llm
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(SERVICE_DIR, "data", "benchmarks")
+
+PAGE_PATHS = {"listing": "/listing", "detail": "/detail/{n}", "heavy": "/heavy", "js": "/js-listing"}
+# The service learns fetch modes per domain, and the client-rendered page switches its domain to the browser.
+# It is served under its own host name so the other pages are fetched the same way whatever ran before them.
+FIXTURE_HOST = "127.0.0.1"
+PAGE_HOSTS = {"js": "localhost"}
+
+LISTING_SCHEMA = {
+    "name": "Listings",
+    "baseSelector": "article.listing-card",
+    "fields": [
+        {"name": "title", "selector": ".listing-title", "type": "text"},
+        {"name": "price", "selector": ".listing-price", "type": "text"},
+        {"name": "url", "selector": "a.listing-link", "type": "attribute", "attribute": "href"},
+    ],
+}
+DETAIL_SCHEMA = {
+    "name": "Property",
+    "baseSelector": "main.property-detail",
+    "fields": [
+        {"name": "address", "selector": ".property-address", "type": "text"},
+        {"name": "price", "selector": ".property-price", "type": "text"},
+        {"name": "beds", "selector": ".beds", "type": "text"},
+        {"name": "baths", "selector": ".baths", "type": "text"},
+        {"name": "agent", "selector": ".agent-name", "type": "text"},
+    ],
+}
+LISTING_PROMPT = "Extract every property listing on the page as {\"items\": [{\"title\": ..., \"price\": ..., \"url\": ...}]}."
+DETAIL_PROMPT = "Extract the property's address, price, bedrooms, bathrooms and listing agent as a JSON object."
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def scrape_payload(mode: str, page: str, url: str) -> dict:
+    payload = {"url": url, "bypass_cache": True}
+    if mode == "schema":
+        payload["schema"] = DETAIL_SCHEMA if page == "detail" else LISTING_SCHEMA
+    else:
+        payload["prompt"] = DETAIL_PROMPT if page == "detail" else LISTING_PROMPT
+    return payload
+
+
+class MemorySampler:
+    """Polls the service's /metrics for service and browser RSS while a scenario runs, keeping the peaks."""
+
+    def __init__(self, client: httpx.AsyncClient, service_url: str, interval: float = 0.5):
+        self.client = client
+        self.service_url = service_url
+        self.interval = interval
+        self.peak_service_bytes = 0.0
+        self.peak_browser_bytes = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def sample(self):
+        try:
+            text = (await self.client.get(f"{self.service_url}/metrics")).text
+        except httpx.HTTPError:
+            return
+        for name, attribute in (("service_memory_bytes", "peak_service_bytes"), ("browser_memory_bytes", "peak_browser_bytes")):
+            match = re.search(rf"^{name} ([0-9.e+]+)$", text, re.M)
+            if match:
+                setattr(self, attribute, max(getattr(self, attribute), float(match.group(1))))
+
+    async def _run(self):
+        while True:
+            await self.sample()
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+async def run_scenario(client: httpx.AsyncClient, service_url: str, fixture_url: str, mode: str, page: str,
+                       concurrency: int, requests: int, run_id: str) -> dict:
+    latencies: list[float] = []
+    errors: list[str] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for n in counter:
+            # A unique query string per request keeps the service's caches and request coalescing out of the numbers
+            url = f"{fixture_url}{PAGE_PATHS[page].format(n=n + 1)}?bench={run_id}-{mode}-{page}-{concurrency}-{n}"
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{service_url}/scrape", json=scrape_payload(mode, page, url))
+                body = response.json()
+                if response.status_code != 200 or not body.get("success"):
+                    errors.append(str(body.get("error") or body.get("detail") or response.status_code)[:200])
+            except (httpx.HTTPError, ValueError) as e:
+                errors.append(f"{type(e).__name__}: {e}"[:200])
+            latencies.append(time.perf_counter() - started)
+
+    with MemorySampler(client, service_url) as memory:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        await memory.sample()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "page": page,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        "peak_service_mb": round(memory.peak_service_bytes / 2**20, 1),
+        "peak_browser_mb": round(memory.peak_browser_bytes / 2**20, 1),
+    }
+
+
+def start_service(port: int, fixture_hosts: list[str], stub_url: str, workdir: str, extra_env: dict) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "GOOGLE_AI_API_KEY": "benchmark-stub-key",
+        "LLM_PROVIDER": "openai/benchmark-stub",
+        "LLM_BASE_URL": f"{stub_url}/v1",
+        "GEMINI_API_ENDPOINT": stub_url,
+        "EXTRACTION_CACHE_ENABLED": "false",
+        # The fixture server is local: don't let per-domain politeness throttle the load
+        "DOMAIN_LIMITS": json.dumps({host: {"rate": 10000, "burst": 10000, "concurrency": 256} for host in fixture_hosts}),
+        "EXTRACTION_CACHE_PATH": os.path.join(workdir, "extraction_cache.db"),
+        "AUTO_SCHEMA_PATH": os.path.join(workdir, "auto_schemas.db"),
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.db"),
+        "PAGE_FINGERPRINTS_PATH": os.path.join(workdir, "page_fingerprints.db"),
+        "DOMAIN_STATE_PATH": os.path.join(workdir, "domain_state.db"),
+        "FAILURE_ARTIFACT_DIR": os.path.join(workdir, "failure_artifacts"),
+        "LOG_LEVEL": "WARNING",
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        **extra_env,
+    }
+    # serve.py honours WEB_CONCURRENCY, so --env WEB_CONCURRENCY=4 benchmarks multi-worker mode
+    return subprocess.Popen([sys.executable, "serve.py"], cwd=SERVICE_DIR, env=env)
+
+
+async def wait_until_ready(client: httpx.AsyncClient, service_url: str, timeout: float = 180.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(f"{service_url}/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(1.0)
+    raise RuntimeError(f"Service at {service_url} did not become ready within {timeout:.0f}s")
+
+
+def previous_results(results_dir: str) -> dict | None:
+    files = sorted(glob.glob(os.path.join(results_dir, "*.json")))
+    if not files:
+        return None
+    with open(files[-1], encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(current: list[dict], previous: dict | None, threshold: float) -> list[str]:
+    """Prints the scenarios side by side with the previous run; returns the regressions."""
+    baseline = {}
+    if previous:
+        baseline = {(s["mode"], s["page"], s["concurrency"]): s for s in previous["scenarios"]}
+        print(f"\nCompared with {previous['label']} ({previous['started_at']}, commit {previous.get('git_commit') or '?'})")
+    header = f"{'mode':<7}{'page':<9}{'conc':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'svc MB':>8}{'brw MB':>8}  change"
+    print(header)
+    print("-" * len(header))
+    regressions = []
+    for s in current:
+        key = (s["mode"], s["page"], s["concurrency"])
+        change = ""
+        before = baseline.get(key)
+        if before:
+            p95_delta = (s["latency_ms"]["p95"] - before["latency_ms"]["p95"]) / before["latency_ms"]["p95"] if before["latency_ms"]["p95"] else 0.0
+            rps_delta = (s["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] if before["throughput_rps"] else 0.0
+            change = f"p95 {p95_delta:+.0%}, rps {rps_delta:+.0%}"
+            if p95_delta > threshold or rps_delta < -threshold:
+                change += "  REGRESSION"
+                regressions.append(f"{key}: {change}")
+        print(f"{s['mode']:<7}{s['page']:<9}{s['concurrency']:>5}{s['throughput_rps']:>9.2f}{s['latency_ms']['p50']:>10.0f}"
+              f"{s['latency_ms']['p95']:>10.0f}{s['latency_ms']['p99']:>10.0f}{s['errors']:>8}{s['peak_service_mb']:>8.0f}"
+              f"{s['peak_browser_mb']:>8.0f}  {change}")
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> int:
+    fixture_server = start_fixture_server(port=args.fixture_port)
+    stub = start_stub_llm(port=args.stub_port, latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms)
+    fixture_urls = {page: f"http://{PAGE_HOSTS.get(page, FIXTURE_HOST)}:{fixture_server.server_port}" for page in PAGE_PATHS}
+    stub_url = f"http://127.0.0.1:{stub.server_port}"
+    service_url = args.service_url
+    service = None
+    workdir = tempfile.mkdtemp(prefix="crawl4ai-bench-")
+    if not service_url:
+        extra_env = dict(item.split("=", 1) for item in args.env)
+        service = start_service(args.service_port, [FIXTURE_HOST, *PAGE_HOSTS.values()], stub_url, workdir, extra_env)
+        service_url = f"http://127.0.0.1:{args.service_port}"
+
+    scenarios = []
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    run_id = time.strftime("%Y%m%d%H%M%S")
+    try:
+        async with httpx.AsyncClient(timeout=args.timeout) as client:
+            await wait_until_ready(client, service_url)
+            for mode in args.modes:
+                for page in args.pages:
+                    # One unmeasured request per scenario so one-off costs (first navigation, imports) aren't counted
+                    await run_scenario(client, service_url, fixture_urls[page], mode, page, 1, 1, run_id + "-warmup")
+                    for concurrency in args.concurrency:
+                        result = await run_scenario(client, service_url, fixture_urls[page], mode, page, concurrency,
+                                                    max(args.requests, concurrency), run_id)
+                        print(f"{mode}/{page} x{concurrency}: {result['throughput_rps']:.2f} rps, "
+                              f"p95 {result['latency_ms']['p95']:.0f} ms, {result['errors']} errors")
+                        scenarios.append(result)
+    finally:
+        if service:
+            service.terminate()
+            try:
+                service.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                service.kill()
+        fixture_server.shutdown()
+        stub.shutdown()
+
+    previous = previous_results(args.results_dir)
+    regressions = compare(scenarios, previous, args.regression_threshold)
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{run_id}-{args.label}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "label": args.label,
+            "started_at": started_at,
+            "git_commit": git_commit(),
+            "config": {"llm_latency_ms": args.llm_latency_ms, "llm_jitter_ms": args.llm_jitter_ms,
+                       "requests": args.requests, "env": args.env},
+            "scenarios": scenarios,
+        }, f, indent=2)
+    print(f"\nResults saved to {path}")
+    if regressions:
+        print(f"{len(regressions)} scenario(s) regressed by more than {args.regression_threshold:.0%}")
+        return 1 if args.fail_on_regression else 0
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load benchmark for the scrape service.")
+    parser.add_argument("--modes", default="schema,llm", type=lambda v: v.split(","), help="Comma-separated: schema,llm")
+    parser.add_argument("--pages", default="listing,detail,heavy,js", type=lambda v: v.split(","),
+                        help="Comma-separated: listing,detail,heavy,js")
+    parser.add_argument("--concurrency", default="1,4,16", type=lambda v: [int(c) for c in v.split(",")])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per scenario (at least the concurrency).")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--service-url", help="Benchmark an already running service instead of launching one.")
+    parser.add_argument("--service-port", type=int, default=8101)
+    parser.add_argument("--fixture-port", type=int, default=0)
+    parser.add_argument("--stub-port", type=int, default=0)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for the launched service, e.g. --env SCRAPE_MAX_CONCURRENCY=16")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--regression-threshold", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Stub LLM endpoint with configurable latency, standing in for Gemini during benchmarks.
+
+Speaks the two protocols the service uses:
+  POST /v1/chat/completions                      OpenAI-compatible, used by LLMExtractionStrategy via litellm
+                                                 (service env: LLM_PROVIDER=openai/stub, LLM_BASE_URL=http://host:port/v1)
+  POST /v1beta/models/<model>:generateContent    Gemini REST, used by the direct fallback and schema learning
+                                                 (service env: GEMINI_API_ENDPOINT=http://host:port)
+  GET  /stats                                    number of calls served
+
+Every call sleeps latency_ms (+/- jitter_ms) and answers with a canned JSON extraction, so benchmark
+numbers reflect the service's own overhead plus a known, fixed LLM cost.
+
+Run standalone: python -m benchmarks.stub_llm --port 8090 --latency-ms 800
+"""
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE = {
+    "items": [
+        {"title": "107 Maple Ave, Springfield, IL 62701", "price": "$208,750", "url": "/detail/1"},
+        {"title": "114 Oak St, Springfield, IL 62702", "price": "$232,500", "url": "/detail/2"},
+        {"title": "121 Pine Rd, Springfield, IL 62703", "price": "$256,250", "url": "/detail/3"},
+    ]
+}
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    latency_ms: float = 800.0
+    jitter_ms: float = 100.0
+    response_text: str = json.dumps(DEFAULT_RESPONSE)
+    calls = {"chat_completions": 0, "generate_content": 0}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _simulate_latency(self):
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        time.sleep(delay)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, dict(self.calls))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            kind = "chat_completions"
+            prompt_chars = sum(len(str(message.get("content", ""))) for message in request.get("messages", []))
+            body = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.response_text}}],
+                "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(self.response_text) // 4,
+                          "total_tokens": (prompt_chars + len(self.response_text)) // 4},
+            }
+        elif re.search(r"/models/[^/:]+:generateContent$", self.path.split("?")[0]):
+            kind = "generate_content"
+            body = {
+                "candidates": [{"index": 0, "finishReason": "STOP",
+                                "content": {"role": "model", "parts": [{"text": self.response_text}]}}],
+                "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": len(self.response_text) // 4},
+            }
+        else:
+            self.send_error(404)
+            return
+        self._simulate_latency()
+        with self.lock:
+            self.calls[kind] += 1
+        self._send_json(200, body)
+
+
+def start_stub_llm(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 800.0, jitter_ms: float = 100.0,
+                   response: dict | None = None) -> ThreadingHTTPServer:
+    """Starts the stub on a daemon thread; port 0 picks a free port (see server.server_port)."""
+    StubLLMHandler.latency_ms = latency_ms
+    StubLLMHandler.jitter_ms = jitter_ms
+    StubLLMHandler.response_text = json.dumps(response or DEFAULT_RESPONSE)
+    server = ThreadingHTTPServer((host, port), StubLLMHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Stub LLM listening on http://{host}:{server.server_port} ({latency_ms:.0f}ms +/- {jitter_ms:.0f}ms)")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub LLM endpoint with configurable latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--response-file", help="JSON file with the extraction every call returns.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    response = None
+    if args.response_file:
+        with open(args.response_file, encoding="utf-8") as f:
+            response = json.load(f)
+    start_stub_llm(args.host, args.port, args.latency_ms, args.jitter_ms, response)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
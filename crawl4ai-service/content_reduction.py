@@ -0,0 +1,188 @@
+import json
+import re
+from html import unescape
+from html.parser import HTMLParser
+
+from load_profiles import is_tracker_url
+
+# Elements whose content never holds extractable data (<head> is handled apart: its end tag is optional)
+NOISE_TAGS = {"script", "style", "svg", "noscript", "iframe", "template", "canvas", "object"}
+# Void elements (no end tag, no content) that are dropped
+VOID_NOISE_TAGS = {"embed", "source", "track", "param", "wbr", "link", "meta", "base"}
+# Elements that may appear in <head>; any other start tag implicitly ends it, as in browsers
+HEAD_TAGS = {"title", "meta", "link", "base", "style", "script", "noscript", "template"}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "footer", "aside", "nav", "ul", "ol", "li",
+    "table", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "br", "hr", "dl", "dt", "dd", "form", "figure",
+}
+
+
+def strip_html_noise(html: str) -> str:
+    """Removes scripts, styles, SVGs and comments while keeping the markup (for CSS selector work)."""
+    html = re.sub(r"<(script|style|svg|noscript)\b.*?</\1>", "", html, flags=re.S | re.I)
+    html = re.sub(r"<!--.*?-->", "", html, flags=re.S)
+    return re.sub(r"\s+", " ", html)
+
+
+class _MarkdownConverter(HTMLParser):
+    """Minimal HTML -> markdown-ish text: keeps text, headings, list items, links and image URLs."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip_depth = 0
+        self._in_head = False
+        self._link_stack: list[str | None] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "head":
+            self._in_head = True
+            return
+        if self._in_head and tag not in HEAD_TAGS:
+            self._in_head = False # <body> or page content without an explicit </head>
+        if tag in VOID_NOISE_TAGS:
+            return
+        if tag in NOISE_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth or self._in_head:
+            return
+        attrs = dict(attrs)
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self.parts.append("#" * int(tag[1]) + " ")
+        elif tag == "li":
+            self.parts.append("- ")
+        elif tag == "a":
+            href = attrs.get("href")
+            if href and (href.startswith("javascript:") or href.startswith("#") or is_tracker_url(href)):
+                href = None
+            self._link_stack.append(href)
+            if href:
+                self.parts.append("[")
+        elif tag == "img":
+            src = attrs.get("src") or attrs.get("data-src")
+            if src and not src.startswith("data:") and not is_tracker_url(src):
+                self.parts.append(f"![{attrs.get('alt') or ''}]({src})")
+        elif tag in ("td", "th"):
+            self.parts.append(" | ")
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self._in_head = False
+            return
+        if tag in VOID_NOISE_TAGS:
+            return
+        if tag in NOISE_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._skip_depth or self._in_head:
+            return
+        if tag == "a" and self._link_stack:
+            href = self._link_stack.pop()
+            if href:
+                self.parts.append(f"]({href})")
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth and not self._in_head:
+            self.parts.append(data)
+
+
+def html_to_compact_text(html: str) -> str:
+    """
+    Reduces a page to compact markdown-ish text for LLM prompts: drops scripts, styles, SVG,
+    tracking pixels and markup, keeps text, headings, list items, table cells, links and images.
+    """
+    converter = _MarkdownConverter()
+    try:
+        converter.feed(html)
+        converter.close()
+        text = "".join(converter.parts)
+    except Exception:
+        # Badly broken markup: fall back to regex tag stripping
+        text = re.sub(r"<[^>]+>", " ", strip_html_noise(html))
+    text = unescape(text)
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text/markup)."""
+    return (len(text) + 3) // 4
+
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = 0) -> list[str]:
+    """
+    Splits text into chunks of at most ~max_tokens, on line boundaries where possible.
+    The last `overlap_tokens` of each chunk are repeated at the start of the next so records
+    cut at a boundary still appear whole in one chunk.
+    """
+    max_chars = max_tokens * 4
+    overlap_chars = min(overlap_tokens * 4, max_chars // 2)
+    if len(text) <= max_chars:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            newline = text.rfind("\n", start + max_chars // 2, end)
+            if newline != -1:
+                end = newline
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+    return chunks
+
+
+def _record_key(record) -> str:
+    if isinstance(record, dict) and record.get("url"):
+        return f"url:{record['url']}"
+    return json.dumps(record, sort_keys=True, default=str)
+
+
+def merge_extractions(results: list) -> dict | list | None:
+    """
+    Merges per-chunk LLM results. `{"items": [...]}` results are concatenated with duplicate
+    records removed (by `url` when present, otherwise by content); single-object results are
+    merged field by field, keeping the first non-empty value.
+    """
+    results = [result for result in results if result is not None]
+    if not results:
+        return None
+    if any(isinstance(result, list) or (isinstance(result, dict) and "items" in result) for result in results):
+        merged, seen = [], set()
+        for result in results:
+            items = result if isinstance(result, list) else result.get("items") if isinstance(result, dict) else None
+            for item in items or []:
+                key = _record_key(item)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(item)
+        return {"items": merged}
+    merged = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        for field, value in result.items():
+            if merged.get(field) in (None, "", [], {}):
+                merged[field] = value
+    return merged
+
+
+def dedupe_chunked_result(data):
+    """
+    Removes the duplicates that overlapping chunks leave in a chunked extraction whose per-chunk
+    results were already concatenated (crawl4ai's LLMExtractionStrategy with apply_chunking).
+    Keeps the result's shape: a list stays a list, `{"items": [...]}` stays a dict.
+    """
+    if isinstance(data, list):
+        return merge_extractions([data])["items"]
+    if isinstance(data, dict) and isinstance(data.get("items"), list):
+        return {**data, "items": merge_extractions([data])["items"]}
+    return data
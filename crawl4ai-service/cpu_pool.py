@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from crawl4ai.content_filter_strategy import PruningContentFilter
+from crawl4ai.extraction_strategy import JsonCssExtractionStrategy
+
+logger = logging.getLogger(__name__)
+
+
+def run_css_schema(schema: dict, url: str, html: str) -> list[dict]:
+    """Runs a JsonCss schema over already-fetched HTML."""
+    strategy = JsonCssExtractionStrategy(schema=schema, verbose=False)
+    return strategy.extract(url, html) or []
+
+
+def prune_content(html: str) -> list[str]:
+    """Main content blocks of a page, with the same pruning used for LLM extraction."""
+    return PruningContentFilter(threshold=0.5, threshold_type="relative", min_word_threshold=50).filter_content(html)
+
+
+def next_page_link(html: str | None, page_url: str, selector: str) -> str | None:
+    """Absolute URL of the 'next page' link matched by `selector`, if any."""
+    if not html:
+        return None
+    link = BeautifulSoup(html, "html.parser").select_one(selector)
+    href = link.get("href") if link else None
+    return urljoin(page_url, href) if href else None
+
+
+class CpuPool:
+    """
+    Runs CPU-bound parsing (content pruning, CSS extraction, page analysis, pagination links) in worker processes so it
+    doesn't hold up the event loop, which only one core can run. Tasks must be picklable module-level
+    functions. With workers=0 they run inline. A pool that lost a process (e.g. killed for memory) is
+    replaced, and the task that hit it runs inline.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(0, workers)
+        self.tasks = 0
+        self.restarts = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: workers start from a clean interpreter instead of forking a process that runs threads and browsers
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args):
+        self.tasks += 1
+        if not self.workers:
+            return fn(*args)
+        executor = self._get_executor()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            if self._executor is executor:
+                logger.error("CPU pool process died, starting a new pool")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self.restarts += 1
+            return fn(*args)
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "tasks": self.tasks, "restarts": self.restarts}
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
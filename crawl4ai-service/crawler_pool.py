@@ -0,0 +1,451 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+import psutil
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CacheMode, CrawlerRunConfig
+
+logger = logging.getLogger(__name__)
+
+# Tiny page rendered in a freshly started browser so the first real request doesn't pay for
+# creating the browser context and first page
+WARM_UP_URL = "raw:<html><head><title>warm-up</title></head><body><p>warm-up</p></body></html>"
+
+
+class PoolNotReady(Exception):
+    """The default browser did not come up within the pool's ready timeout."""
+
+
+def header_profile_key(headers: dict) -> str:
+    """
+    Stable hash of a header profile. Header names are case-insensitive, so they are
+    lower-cased and sorted before hashing.
+    """
+    normalized = sorted((str(k).lower(), str(v)) for k, v in headers.items())
+    return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class PooledCrawler:
+    key: str
+    headers: dict
+    crawler: AsyncWebCrawler
+    pinned: bool = False # The default profile is never evicted
+    in_use: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    navigations: int = 0 # Page navigations made with this browser (see CrawlerPool.count_navigation)
+    processes: list[psutil.Process] = field(default_factory=list) # Playwright driver started for this crawler and its browser processes
+    retiring: bool = False # Replaced or crashed: takes no new requests, closed once in-flight ones finish
+
+
+def _direct_children() -> dict[int, psutil.Process]:
+    children = {}
+    for child in psutil.Process().children():
+        try:
+            # CPU pool workers are Python children too: they must not be taken for a browser's processes
+            if not child.name().lower().startswith("python"):
+                children[child.pid] = child
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return children
+
+
+def _with_descendants(processes: list[psutil.Process]) -> dict[int, psutil.Process]:
+    """The still-running `processes` and all of their descendants, by pid."""
+    found = {}
+    for process in processes:
+        try:
+            # is_running() also compares the creation time, so a reused pid doesn't count
+            if process.is_running():
+                found[process.pid] = process
+                found.update((child.pid, child) for child in process.children(recursive=True))
+        except psutil.Error:
+            continue
+    return found
+
+
+class CrawlerPool:
+    """
+    Keeps one started AsyncWebCrawler per header profile so requests with custom headers
+    reuse a warm browser instead of launching a new one.
+    Entries are kept in LRU order; when the pool is full the least recently used idle
+    entry is closed, and entries idle for longer than `idle_ttl` seconds are reaped.
+    `hooks` ({hook_type: fn}) are installed on every crawler's strategy.
+
+    Browsers are managed over their lifetime: each new crawler renders a warm-up page before it
+    takes requests, and a crawler is replaced in the background after `max_navigations` navigations
+    or once its processes use more than `max_rss_mb` MB. In-flight requests finish on the old
+    browser, which is closed afterwards. A browser that disconnects (crash) is dropped and relaunched.
+    The pool is `ready` once the default-profile crawler is started and warm; checkouts wait for that
+    for at most `ready_timeout` seconds and then raise PoolNotReady.
+
+    Only browsers are kept warm, not pages: every navigation gets a fresh page, because the
+    on_page_context_created hook installs that request's load-profile routes and counters on it.
+    A reused page would keep the previous request's route handlers (and cookies, storage and
+    service workers of the last site). Opening a page in a running context takes milliseconds;
+    the browser launch and first context, which the warm-up covers, are the expensive part.
+    """
+
+    def __init__(self, default_headers: dict, max_size: int = 4, idle_ttl: float = 600.0, hooks: dict | None = None,
+                 max_navigations: int = 0, max_rss_mb: float = 0.0, check_interval: float = 30.0,
+                 ready_timeout: float = 60.0):
+        self.default_headers = default_headers
+        self.hooks = hooks or {}
+        self.max_size = max(1, max_size)
+        self.idle_ttl = idle_ttl
+        self.max_navigations = max_navigations # 0 disables navigation-based recycling
+        self.max_rss_mb = max_rss_mb # 0 disables memory-based recycling
+        self.check_interval = check_interval
+        self.ready_timeout = ready_timeout
+        self._default_key = header_profile_key(default_headers)
+        self._entries: "OrderedDict[str, PooledCrawler]" = OrderedDict()
+        self._retiring: list[PooledCrawler] = []
+        self._replacing: set[str] = set()
+        self._launching: dict[str, asyncio.Future] = {} # One launch per header profile, awaited by concurrent checkouts
+        self._condition = asyncio.Condition()
+        self._launch_lock = asyncio.Lock()
+        self._ready = asyncio.Event()
+        self._reaper_task: asyncio.Task | None = None
+        self._background: set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.recycles = 0
+        self.crashes = 0
+
+    def _browser_config(self, headers: dict) -> BrowserConfig:
+        # Note: --no-sandbox via args caused a TypeError with this crawl4ai version, so it is not passed
+        return BrowserConfig(headless=True, verbose=False, headers=headers)
+
+    async def _launch(self, key: str, headers: dict, pinned: bool = False) -> PooledCrawler:
+        logger.info(f"Launching AsyncWebCrawler for header profile {key}")
+        # Launches are serialized so the processes that appear can be attributed to this crawler
+        async with self._launch_lock:
+            before = _direct_children()
+            crawler = AsyncWebCrawler(config=self._browser_config(headers))
+            for hook_type, hook in self.hooks.items():
+                crawler.crawler_strategy.set_hook(hook_type, hook)
+            await crawler.start()
+            # Only this process's new direct children (the driver) belong to this crawler: renderers
+            # that other browsers start meanwhile are their browsers' descendants, not ours
+            processes = [process for pid, process in _direct_children().items() if pid not in before]
+        entry = PooledCrawler(key=key, headers=headers, crawler=crawler, pinned=pinned,
+                              processes=list(_with_descendants(processes).values()))
+        await self._warm_up(entry)
+        return entry
+
+    async def _warm_up(self, entry: PooledCrawler):
+        started = time.monotonic()
+        try:
+            await entry.crawler.arun(url=WARM_UP_URL, config=CrawlerRunConfig(cache_mode=CacheMode.BYPASS, process_in_browser=True))
+            logger.info(f"Warmed up AsyncWebCrawler for header profile {entry.key} in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            logger.warning(f"Warm-up of AsyncWebCrawler for header profile {entry.key} failed: {e}")
+
+    async def _close_entry(self, entry: PooledCrawler):
+        # Collected before close(): once the browser exits, its renderers are no longer its descendants
+        processes = _with_descendants(entry.processes)
+        try:
+            await entry.crawler.close()
+            logger.info(f"Closed AsyncWebCrawler for header profile {entry.key}")
+        except Exception as e:
+            logger.error(f"Error closing AsyncWebCrawler for header profile {entry.key}: {e}")
+        # A crashed or hung browser may not exit on close(): make sure none of its processes linger
+        for process in processes.values():
+            try:
+                if process.is_running():
+                    process.kill()
+            except psutil.Error:
+                pass
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def start(self):
+        """
+        Starts the maintenance loop and launches the default-profile crawler in the background;
+        requests wait until it is warm, and `ready` turns true once it is.
+        """
+        self._reaper_task = asyncio.create_task(self._maintain())
+        self._spawn(self._start_default())
+
+    async def _start_default(self):
+        delay = 1.0
+        while True:
+            try:
+                entry = await self._launch(self._default_key, self.default_headers, pinned=True)
+                break
+            except Exception as e:
+                logger.error(f"Failed to launch the default crawler, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(60.0, delay * 2)
+        async with self._condition:
+            self._entries[self._default_key] = entry
+            self._condition.notify_all()
+        self._ready.set()
+        logger.info("Crawler pool is warm and ready")
+
+    @property
+    def ready(self) -> bool:
+        entry = self._entries.get(self._default_key)
+        return self._ready.is_set() and entry is not None and self._alive(entry)
+
+    async def wait_ready(self):
+        await self._ready.wait()
+
+    async def close(self):
+        for task in [self._reaper_task, *self._background]:
+            if task:
+                task.cancel()
+        await asyncio.gather(*[task for task in [self._reaper_task, *self._background] if task], return_exceptions=True)
+        async with self._condition:
+            entries = list(self._entries.values()) + self._retiring
+            self._entries.clear()
+            self._retiring = []
+        for entry in entries:
+            await self._close_entry(entry)
+
+    def _alive(self, entry: PooledCrawler) -> bool:
+        """False once the browser has disconnected or all of its processes are gone."""
+        browser_manager = getattr(entry.crawler.crawler_strategy, "browser_manager", None)
+        browser = getattr(browser_manager, "browser", None)
+        if browser is not None and not browser.is_connected():
+            return False
+        if entry.processes and not any(process.is_running() for process in entry.processes):
+            return False
+        return True
+
+    def _rss_bytes(self, entry: PooledCrawler) -> int:
+        # Renderers started since launch are picked up as descendants; each process is counted once
+        total = 0
+        for process in _with_descendants(entry.processes).values():
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    def _retire(self, entry: PooledCrawler):
+        """Takes an entry out of rotation (call with the condition held); it is closed once idle."""
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        if not entry.retiring:
+            entry.retiring = True
+            self._retiring.append(entry)
+        self._condition.notify_all()
+
+    async def _close_idle_retired(self):
+        async with self._condition:
+            idle = [entry for entry in self._retiring if entry.in_use == 0]
+            self._retiring = [entry for entry in self._retiring if entry.in_use > 0]
+        for entry in idle:
+            await self._close_entry(entry)
+
+    async def _handle_crash(self, entry: PooledCrawler):
+        async with self._condition:
+            if entry.retiring:
+                return
+            self.crashes += 1
+            logger.error(f"Browser for header profile {entry.key} crashed or disconnected; relaunching")
+            self._retire(entry)
+        if entry.pinned:
+            # Relaunch the default profile right away rather than on the next request
+            self._spawn(self._replace(entry))
+        await self._close_idle_retired()
+
+    async def _replace(self, entry: PooledCrawler):
+        """Launches and warms a successor for `entry` off the request path, then swaps it in."""
+        if entry.key in self._replacing:
+            return
+        self._replacing.add(entry.key)
+        try:
+            fresh = await self._launch(entry.key, entry.headers, pinned=entry.pinned)
+        except Exception as e:
+            logger.error(f"Failed to launch a replacement crawler for header profile {entry.key}: {e}")
+            self._replacing.discard(entry.key)
+            return
+        try:
+            async with self._condition:
+                current = self._entries.get(entry.key)
+                if current is entry or (current is None and entry.key not in self._launching and (entry.pinned or self._has_room())):
+                    self._entries[entry.key] = fresh
+                    fresh = None
+                self._retire(entry)
+                self.recycles += 1
+            if fresh:
+                # A checkout already relaunched this profile in the meantime
+                await self._close_entry(fresh)
+            await self._close_idle_retired()
+        finally:
+            self._replacing.discard(entry.key)
+
+    def _needs_recycle(self, entry: PooledCrawler, check_memory: bool = False) -> str | None:
+        if self.max_navigations and entry.navigations >= self.max_navigations:
+            return f"{entry.navigations} navigations"
+        if check_memory and self.max_rss_mb:
+            rss_mb = self._rss_bytes(entry) / (1024 * 1024)
+            if rss_mb > self.max_rss_mb:
+                return f"{rss_mb:.0f} MB RSS"
+        return None
+
+    def _evictable(self) -> PooledCrawler | None:
+        # OrderedDict iterates least recently used first
+        for entry in self._entries.values():
+            if not entry.pinned and entry.in_use == 0:
+                return entry
+        return None
+
+    def _has_room(self) -> bool:
+        # Launches in progress count towards the pool size
+        return len(self._entries) + len(self._launching) < self.max_size
+
+    def _take(self, entry: PooledCrawler) -> PooledCrawler:
+        """Checks an entry out (call with the condition held)."""
+        entry.in_use += 1
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(entry.key)
+        return entry
+
+    async def _checkout(self, headers: dict) -> PooledCrawler:
+        key = header_profile_key(headers)
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.ready_timeout)
+        except asyncio.TimeoutError:
+            raise PoolNotReady(f"Browser not ready after {self.ready_timeout:.0f}s") from None
+        while True:
+            launching = None
+            evicted = []
+            async with self._condition:
+                while True:
+                    entry = self._entries.get(key)
+                    if entry and not self._alive(entry):
+                        self.crashes += 1
+                        logger.error(f"Browser for header profile {key} crashed or disconnected; relaunching")
+                        self._retire(entry)
+                        entry = None
+                    if entry:
+                        self.hits += 1
+                        return self._take(entry)
+                    pending = self._launching.get(key)
+                    if pending:
+                        # Another request is already launching this profile: wait for it outside the lock
+                        break
+                    if self._has_room():
+                        self.misses += 1
+                        pending = launching = asyncio.get_running_loop().create_future()
+                        self._launching[key] = pending
+                        break
+                    victim = self._evictable()
+                    if victim:
+                        del self._entries[victim.key]
+                        self.evictions += 1
+                        logger.info(f"Evicting least recently used header profile {victim.key}")
+                        evicted.append(victim)
+                        continue
+                    # Pool is full and every entry is busy: wait for a release
+                    await self._condition.wait()
+            # Browsers are launched, warmed up and closed without holding the lock, so requests for
+            # other profiles and releases aren't blocked behind them
+            for victim in evicted:
+                await self._close_entry(victim)
+            if launching is None:
+                await asyncio.shield(pending)
+                continue
+            entry = None
+            try:
+                entry = await self._launch(key, headers, pinned=key == self._default_key)
+            finally:
+                async with self._condition:
+                    del self._launching[key]
+                    if entry:
+                        self._entries[key] = entry
+                        self._take(entry)
+                    self._condition.notify_all()
+                launching.set_result(None)
+            return entry
+
+    async def _release(self, entry: PooledCrawler):
+        async with self._condition:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            self._condition.notify_all()
+        if entry.retiring:
+            await self._close_idle_retired()
+        elif not self._alive(entry):
+            await self._handle_crash(entry)
+        elif reason := self._needs_recycle(entry):
+            if entry.key not in self._replacing:
+                logger.info(f"Recycling browser for header profile {entry.key} after {reason}")
+                self._spawn(self._replace(entry))
+
+    def count_navigation(self, crawler: AsyncWebCrawler):
+        """Counts a page navigation against the pooled browser `crawler` belongs to."""
+        for entry in [*self._entries.values(), *self._retiring]:
+            if entry.crawler is crawler:
+                entry.navigations += 1
+                return
+
+    @asynccontextmanager
+    async def acquire(self, headers: dict | None = None):
+        """Yields a started AsyncWebCrawler for the given header profile (defaults if None)."""
+        entry = await self._checkout(headers or self.default_headers)
+        try:
+            yield entry.crawler
+        finally:
+            await self._release(entry)
+
+    async def _maintain(self):
+        """Periodically reaps idle profiles and checks every browser for crashes and memory growth."""
+        while True:
+            await asyncio.sleep(max(1.0, min(60.0, self.idle_ttl / 2, self.check_interval)))
+            try:
+                await self._check_browsers()
+                await self._reap_idle()
+            except Exception as e:
+                logger.error(f"Crawler pool maintenance failed: {e}")
+
+    async def _check_browsers(self):
+        for entry in list(self._entries.values()):
+            if not self._alive(entry):
+                await self._handle_crash(entry)
+            elif entry.key not in self._replacing and (reason := self._needs_recycle(entry, check_memory=True)):
+                logger.info(f"Recycling browser for header profile {entry.key} after {reason}")
+                self._spawn(self._replace(entry))
+        await self._close_idle_retired()
+
+    async def _reap_idle(self):
+        now = time.monotonic()
+        async with self._condition:
+            expired = [
+                entry for entry in self._entries.values()
+                if not entry.pinned and entry.in_use == 0 and now - entry.last_used > self.idle_ttl
+            ]
+            for entry in expired:
+                del self._entries[entry.key]
+                self.evictions += 1
+            self._condition.notify_all()
+        for entry in expired:
+            logger.info(f"Reaping idle header profile {entry.key}")
+            await self._close_entry(entry)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "in_use": sum(entry.in_use for entry in self._entries.values()),
+            "retiring": len(self._retiring),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "recycles": self.recycles,
+            "crashes": self.crashes,
+            "navigations": {entry.key: entry.navigations for entry in self._entries.values()},
+        }
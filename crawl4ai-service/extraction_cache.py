@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that never change page content and would only fragment the cache
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "ref", "_ga"}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of a URL for cache keys: lower-cased scheme/host, default ports and
+    fragments dropped, tracking parameters removed and remaining query parameters sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_instruction(prompt: str | None, schema: dict | None) -> str:
+    """Hash of the extraction instruction (CSS schema or LLM prompt)."""
+    if schema is not None:
+        return hash_text("schema:" + json.dumps(schema, sort_keys=True))
+    return hash_text("prompt:" + (prompt or "").strip())
+
+
+class ExtractionCache:
+    """
+    SQLite-backed cache of final extraction results, keyed by
+    (normalized URL, instruction hash, pruned content hash).
+    Entries expire after `ttl` seconds; when the table grows past `max_entries` the least
+    recently accessed entries are evicted. The database file survives restarts.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_entries: int = 10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_cache_last_access ON extraction_cache (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url: str, instruction_hash: str, content_hash: str) -> str:
+        return hash_text(f"{normalize_url(url)}|{instruction_hash}|{content_hash}")
+
+    def _get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT data, created_at FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            data, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE extraction_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(data)
+
+    def _put(self, key: str, url: str, data):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, url, data, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, normalize_url(url), json.dumps(data), now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM extraction_cache WHERE key IN (SELECT key FROM extraction_cache ORDER BY last_access ASC LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    async def get(self, key: str):
+        """Returns the cached data for `key`, or None on a miss/expired entry."""
+        try:
+            return await asyncio.to_thread(self._get, key)
+        except Exception as e:
+            logger.error(f"Extraction cache read failed: {e}")
+            return None
+
+    async def put(self, key: str, url: str, data):
+        try:
+            await asyncio.to_thread(self._put, key, url, data)
+        except Exception as e:
+            logger.error(f"Extraction cache write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
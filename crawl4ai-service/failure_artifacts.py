@@ -0,0 +1,76 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def excerpt(value, limit: int = 500) -> str:
+    """String form of `value` cut to `limit` characters, noting how much was dropped."""
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+def crawl_result_dump(result) -> dict:
+    """Full, JSON-serializable view of a CrawlResult (HTML, markdown, links, media...)."""
+    if result is not None and hasattr(result, "to_dict"):
+        try:
+            return result.to_dict()
+        except Exception as e:
+            return {"repr": repr(result), "to_dict_error": str(e)}
+    return {"repr": repr(result)}
+
+
+class FailureArtifactStore:
+    """
+    Writes full dumps of a sample of failed scrapes to a directory for offline debugging, instead
+    of logging whole CrawlResults. Only the newest `max_files` artifacts are kept.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 0.1, max_files: int = 200):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_files = max(1, max_files)
+        self.saved = 0
+        self.skipped = 0
+
+    def _write(self, url: str, error: str | None, result, extra: dict | None) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", url)[:80].strip("-")
+        path = os.path.join(self.directory, f"{time.time():.6f}-{slug}.json")
+        artifact = {"url": url, "error": error, "saved_at": time.time(), **(extra or {}), "crawl_result": crawl_result_dump(result)}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(artifact, f, default=str)
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        files = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        for name in files[:-self.max_files]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    async def maybe_save(self, url: str, error: str | None, result, extra: dict | None = None) -> str | None:
+        """Saves the failure with probability `sample_rate`; returns the artifact path if saved."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            self.skipped += 1
+            return None
+        try:
+            path = await asyncio.to_thread(self._write, url, error, result, extra)
+        except Exception as e:
+            logger.error(f"Could not save failure artifact for {url}: {e}")
+            return None
+        self.saved += 1
+        logger.info(f"Saved failure artifact for {url} to {path}")
+        return path
+
+    def stats(self) -> dict:
+        return {"directory": self.directory, "sample_rate": self.sample_rate, "saved": self.saved, "skipped": self.skipped}
@@ -0,0 +1,30 @@
+import asyncio
+import logging
+import os
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+# Set by configure() from GEMINI_API_ENDPOINT: sends the direct Gemini calls (fallback extraction, schema
+# learning, /test-gemini) to another host over REST, e.g. the benchmark stub at http://127.0.0.1:8090
+api_endpoint: str | None = None
+
+
+def configure(api_key: str):
+    global api_endpoint
+    api_endpoint = os.getenv("GEMINI_API_ENDPOINT") or None
+    if api_endpoint:
+        logger.info(f"Direct Gemini calls go to {api_endpoint} (REST)")
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": api_endpoint})
+    else:
+        genai.configure(api_key=api_key)
+
+
+async def generate_content(model_name: str, prompt: str, **kwargs):
+    """GenerativeModel(model_name).generate_content for async callers."""
+    model = genai.GenerativeModel(model_name)
+    if api_endpoint:
+        # The REST transport only has a blocking client: run the call in a worker thread
+        return await asyncio.to_thread(model.generate_content, prompt, **kwargs)
+    return await model.generate_content_async(prompt, **kwargs)
@@ -0,0 +1,119 @@
+import logging
+import re
+import time
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Markers of client-side rendered shells (empty app roots, framework bootstraps, JS-required notices)
+JS_SHELL_PATTERNS = [
+    re.compile(r'<div[^>]+id=["\'](root|app|__next|__nuxt|svelte)["\'][^>]*>\s*</div>', re.I),
+    re.compile(r"(enable|requires?) javascript", re.I),
+    re.compile(r"window\.__(NUXT|INITIAL_STATE|APOLLO_STATE)__\s*=", re.I),
+]
+# Markers of bot walls served instead of content (the browser path has a better chance)
+BLOCKED_PATTERNS = re.compile(r"(captcha|cf-challenge|challenge-platform|px-captcha|access denied|are you a robot)", re.I)
+MIN_VISIBLE_TEXT_CHARS = 500
+# needs_browser() reasons that show the site renders client-side, so its domain can be switched to the browser
+JS_SHELL_REASONS = {"javascript rendering", "too little visible text"}
+
+
+def domain_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def visible_text_length(html: str) -> int:
+    text = re.sub(r"<(script|style|noscript|template)\b.*?</\1>", " ", html, flags=re.S | re.I)
+    text = re.sub(r"<[^>]+>", " ", text)
+    return len(re.sub(r"\s+", " ", text).strip())
+
+
+def is_bot_challenge(html: str) -> bool:
+    """
+    True for a bot wall: challenge markers and little visible text. Ordinary pages that merely load a
+    captcha script (e.g. reCAPTCHA on a contact form) have plenty of text and don't count.
+    """
+    return bool(BLOCKED_PATTERNS.search(html[:20000])) and visible_text_length(html) < 5 * MIN_VISIBLE_TEXT_CHARS
+
+
+def needs_browser(html: str) -> str | None:
+    """
+    Returns the reason a plain-HTTP response can't be used as-is (JS-rendered shell,
+    bot wall, too little visible text), or None if the HTML looks server-rendered.
+    """
+    if is_bot_challenge(html):
+        return "bot challenge"
+    for pattern in JS_SHELL_PATTERNS:
+        if pattern.search(html):
+            return "javascript rendering"
+    if visible_text_length(html) < MIN_VISIBLE_TEXT_CHARS:
+        return "too little visible text"
+    return None
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status_code: int
+    html: str
+    headers: dict
+
+
+class HttpFetcher:
+    """
+    Pooled async HTTP client (keep-alive, gzip/deflate) for fetching server-rendered pages
+    without launching a browser navigation.
+    """
+
+    def __init__(self, headers: dict, timeout: float = 20.0, max_connections: int = 50):
+        # brotli decoding needs an extra package, so only advertise encodings httpx can always decode
+        base_headers = {k: v for k, v in headers.items() if k.lower() not in ("accept-encoding", "connection")}
+        base_headers["Accept-Encoding"] = "gzip, deflate"
+        self._client = httpx.AsyncClient(
+            headers=base_headers,
+            follow_redirects=True,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections // 2),
+        )
+
+    async def fetch(self, url: str, headers: dict | None = None) -> FetchResult:
+        extra = {k: v for k, v in (headers or {}).items() if k.lower() not in ("accept-encoding", "connection")}
+        response = await self._client.get(url, headers=extra or None)
+        return FetchResult(url=str(response.url), status_code=response.status_code, html=response.text, headers=dict(response.headers))
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class FetchModeRegistry:
+    """
+    Remembers per domain whether plain HTTP was enough ("http") or the browser was needed
+    ("browser"), so each request doesn't probe both. Decisions expire after `ttl` seconds
+    so sites that change rendering are re-probed.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600):
+        self.ttl = ttl
+        self._modes: dict[str, tuple[str, float]] = {}
+
+    def get(self, domain: str) -> str | None:
+        entry = self._modes.get(domain)
+        if entry is None:
+            return None
+        mode, learned_at = entry
+        if time.monotonic() - learned_at > self.ttl:
+            del self._modes[domain]
+            return None
+        return mode
+
+    def set(self, domain: str, mode: str):
+        if self.get(domain) != mode:
+            logger.info(f"Fetch mode for {domain}: {mode}")
+        self._modes[domain] = (mode, time.monotonic())
+
+    def stats(self) -> dict:
+        modes = [self.get(domain) for domain in list(self._modes)]
+        return {"http_domains": modes.count("http"), "browser_domains": modes.count("browser")}
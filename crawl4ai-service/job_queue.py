@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Number of recently finished jobs used to estimate queue wait and run times
+STATS_WINDOW = 200
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.enqueue when `max_depth` jobs are already waiting."""
+
+    def __init__(self, depth: int):
+        super().__init__(f"Job queue is full ({depth} jobs waiting)")
+        self.depth = depth
+
+
+class JobQueue:
+    """
+    Durable FIFO queue of scrape jobs in SQLite. Jobs move queued -> running -> succeeded/failed.
+    Workers heartbeat the jobs they run, so the queue can be shared by several processes: a 'running'
+    job whose heartbeat went stale (its process died or was stopped mid-job) is put back in the queue.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                webhook_url TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL
+            )
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "heartbeat_at" not in columns: # Queues created before heartbeats
+            try:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            except sqlite3.OperationalError: # Another worker process added it first
+                pass
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+        self._conn.commit()
+
+    def requeue_interrupted(self, stale_after: float) -> int:
+        """Puts back 'running' jobs that haven't had a heartbeat for `stale_after` seconds."""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, heartbeat_at = NULL "
+                "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at, 0) < ?",
+                (time.time() - stale_after,),
+            ).rowcount
+            self._conn.commit()
+        if count:
+            logger.info(f"Re-queued {count} job(s) whose worker stopped mid-job")
+        return count
+
+    def heartbeat(self, job_ids: list[str]):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                [(time.time(), job_id) for job_id in job_ids],
+            )
+            self._conn.commit()
+
+    def enqueue(self, payload: dict, webhook_url: str | None = None, max_depth: int | None = None) -> tuple[str, int]:
+        """
+        Queues a job and returns its id and the queue depth including it. With `max_depth`, raises
+        QueueFull instead once that many jobs are waiting; the check and the insert are one
+        transaction, so worker processes sharing the queue can't overshoot it together.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                depth = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if max_depth is not None and depth >= max_depth:
+                    raise QueueFull(depth)
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, payload, webhook_url, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                    (job_id, json.dumps(payload), webhook_url, time.time()),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return job_id, depth + 1
+
+    def claim_next(self) -> dict | None:
+        """Atomically moves the oldest queued job to 'running' and returns it."""
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, attempts = attempts + 1 "
+                    "WHERE id = ? AND status = 'queued'",
+                    (time.time(), time.time(), row["id"]),
+                ).rowcount
+                self._conn.commit()
+                if claimed:
+                    return self._get(row["id"])
+
+    def finish(self, job_id: str, result: dict | None = None, error: str | None = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                ("failed" if error else "succeeded", json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def _get(self, job_id: str) -> dict | None:
+        row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            return self._get(job_id)
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def purge_finished(self, older_than: float) -> int:
+        with self._lock:
+            count = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+                (time.time() - older_than,),
+            ).rowcount
+            self._conn.commit()
+        return count
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            recent = self._conn.execute(
+                "SELECT AVG(started_at - created_at), AVG(finished_at - started_at) FROM "
+                "(SELECT created_at, started_at, finished_at FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)",
+                (STATS_WINDOW,),
+            ).fetchone()
+        return {
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "succeeded": counts.get("succeeded", 0),
+            "failed": counts.get("failed", 0),
+            "oldest_queued_age_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "avg_wait_seconds": round(recent[0] or 0.0, 3),
+            "avg_run_seconds": round(recent[1] or 0.0, 3),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobWorkerPool:
+    """
+    Fixed number of async workers draining a JobQueue with `handler(payload) -> result dict`.
+    Finished jobs with a webhook_url get their final status POSTed to it (best effort).
+    Running jobs are heartbeated every `heartbeat_interval` seconds; jobs of any process whose
+    heartbeat is four intervals old are re-queued.
+    `total_workers` is the number of workers across all processes sharing the queue (defaults to
+    `workers`); retry_after() estimates the drain time from it.
+    """
+
+    def __init__(self, queue: JobQueue, handler: Callable[[dict], Awaitable[dict]], workers: int = 2,
+                 retention: float = 7 * 24 * 3600, webhook_timeout: float = 10.0, heartbeat_interval: float = 15.0,
+                 total_workers: int | None = None):
+        self.queue = queue
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.total_workers = max(1, total_workers or self.workers)
+        self.retention = retention
+        self.webhook_timeout = webhook_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._running: set[str] = set()
+        self._last_purge = 0.0
+
+    def start(self):
+        self.queue.requeue_interrupted(self.heartbeat_interval * 4)
+        self._tasks = [asyncio.create_task(self._work(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wakes idle workers after a job is enqueued."""
+        self._wakeup.set()
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait: roughly the time to drain the current queue."""
+        stats = self.queue.stats()
+        per_job = stats["avg_run_seconds"] or 5.0
+        return max(1, int(stats["queued"] * per_job / self.total_workers))
+
+    async def _work(self, worker_index: int):
+        while True:
+            job = await asyncio.to_thread(self.queue.claim_next)
+            if job is None:
+                await self._maybe_purge()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logger.info(f"Worker {worker_index} running job {job['id']} for {job['payload'].get('url')}")
+            result, error = None, None
+            self._running.add(job["id"])
+            try:
+                result = await self.handler(job["payload"])
+            except asyncio.CancelledError:
+                # Shutting down: the job stays 'running' and is re-queued once its heartbeat goes stale
+                raise
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}")
+                error = str(getattr(e, "detail", None) or e)
+            finally:
+                self._running.discard(job["id"])
+            await asyncio.to_thread(self.queue.finish, job["id"], result, error)
+            if job.get("webhook_url"):
+                await self._send_webhook(job["id"], job["webhook_url"])
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if self._running:
+                    await asyncio.to_thread(self.queue.heartbeat, list(self._running))
+                if await asyncio.to_thread(self.queue.requeue_interrupted, self.heartbeat_interval * 4):
+                    self.notify()
+            except Exception as e:
+                logger.warning(f"Job heartbeat failed: {e}")
+
+    async def _maybe_purge(self):
+        if time.monotonic() - self._last_purge < 3600:
+            return
+        self._last_purge = time.monotonic()
+        purged = await asyncio.to_thread(self.queue.purge_finished, self.retention)
+        if purged:
+            logger.info(f"Purged {purged} finished job(s) older than {self.retention}s")
+
+    async def _send_webhook(self, job_id: str, webhook_url: str, attempts: int = 3):
+        job: Any = await asyncio.to_thread(self.queue.get, job_id)
+        body = {key: job[key] for key in ("id", "status", "result", "error", "created_at", "started_at", "finished_at")}
+        async with httpx.AsyncClient(timeout=self.webhook_timeout) as client:
+            for attempt in range(1, attempts + 1):
+                try:
+                    response = await client.post(webhook_url, json=body)
+                    response.raise_for_status()
+                    return
+                except httpx.HTTPError as e:
+                    logger.warning(f"Webhook for job {job_id} failed (attempt {attempt}/{attempts}): {e}")
+                    if attempt < attempts:
+                        await asyncio.sleep(2 ** attempt)
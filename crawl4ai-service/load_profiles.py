@@ -0,0 +1,84 @@
+import logging
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Third-party analytics/ads/tag hosts (matched as host suffixes) that never carry listing data
+TRACKER_HOSTS = {
+    "doubleclick.net", "google-analytics.com", "googletagmanager.com", "googlesyndication.com",
+    "googleadservices.com", "adservice.google.com", "connect.facebook.net", "scorecardresearch.com",
+    "quantserve.com", "adsrvr.org", "hotjar.com", "segment.io", "segment.com", "bat.bing.com",
+    "criteo.com", "taboola.com", "outbrain.com", "newrelic.com", "nr-data.net", "mixpanel.com",
+    "amplitude.com", "fullstory.com", "optimizely.com", "clarity.ms", "adnxs.com", "rubiconproject.com",
+}
+
+# Load profiles: which Playwright resource types to abort, whether tracker hosts are blocked,
+# the viewport to use and an optional wait condition. "full" leaves page loading untouched.
+LOAD_PROFILES = {
+    "full": {
+        "block_types": set(),
+        "block_trackers": False,
+        "viewport": None,
+        "wait_for": None,
+    },
+    "no-media": {
+        "block_types": {"image", "media", "font"},
+        "block_trackers": True,
+        "viewport": None,
+        "wait_for": None,
+    },
+    "minimal": {
+        "block_types": {"image", "media", "font", "stylesheet", "texttrack", "eventsource", "manifest"},
+        "block_trackers": True,
+        "viewport": {"width": 800, "height": 600},
+        # Stop waiting as soon as the page has rendered a meaningful amount of text
+        "wait_for": "js:() => document.body && document.body.innerText.trim().length > 50",
+    },
+}
+
+# Rough transfer sizes per blocked resource type, used to estimate bandwidth saved
+TYPICAL_RESOURCE_BYTES = {
+    "image": 60_000, "media": 500_000, "font": 35_000, "stylesheet": 25_000, "script": 40_000,
+    "xhr": 5_000, "fetch": 5_000, "texttrack": 5_000, "eventsource": 1_000, "manifest": 2_000,
+}
+
+
+def is_tracker_url(url: str) -> bool:
+    host = (urlsplit(url).hostname or "").lower()
+    return any(host == tracker or host.endswith("." + tracker) for tracker in TRACKER_HOSTS)
+
+
+def new_resource_stats() -> dict:
+    return {"blocked_requests": 0, "blocked_trackers": 0, "allowed_requests": 0, "estimated_bytes_saved": 0}
+
+
+async def on_page_context_created(page, context=None, config=None, **kwargs):
+    """
+    crawl4ai hook: applies the load profile named in `config.shared_data["load_profile"]`
+    to a fresh page via route interception, counting blocked requests into
+    `config.shared_data["resource_stats"]`.
+    """
+    shared_data = getattr(config, "shared_data", None) or {}
+    profile = LOAD_PROFILES.get(shared_data.get("load_profile", "full"))
+    if not profile or (not profile["block_types"] and not profile["block_trackers"] and not profile["viewport"]):
+        return page
+    stats = shared_data.setdefault("resource_stats", new_resource_stats())
+
+    if profile["viewport"]:
+        await page.set_viewport_size(profile["viewport"])
+
+    async def handle_route(route):
+        request = route.request
+        tracker = profile["block_trackers"] and is_tracker_url(request.url)
+        if tracker or request.resource_type in profile["block_types"]:
+            stats["blocked_requests"] += 1
+            stats["blocked_trackers"] += 1 if tracker else 0
+            stats["estimated_bytes_saved"] += TYPICAL_RESOURCE_BYTES.get(request.resource_type, 0)
+            await route.abort()
+        else:
+            stats["allowed_requests"] += 1
+            await route.continue_()
+
+    if profile["block_types"] or profile["block_trackers"]:
+        await page.route("**/*", handle_route)
+    return page
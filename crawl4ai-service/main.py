@@ -1,18 +1,40 @@
 import os
 import os
 import json
-from contextlib import asynccontextmanager # Import asynccontextmanager for lifespan
-from fastapi import FastAPI, HTTPException, Body
-from pydantic import BaseModel, Field, ValidationError
-from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode, LLMConfig # Import LLMConfig
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Literal
+from contextlib import AsyncExitStack, asynccontextmanager # Import asynccontextmanager for lifespan
+from fastapi import FastAPI, HTTPException, Body, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError
+from urllib.parse import urljoin
+import httpx
+from crawl4ai import AsyncWebCrawler, CrawlerRunConfig, CacheMode, LLMConfig # Import LLMConfig
 from crawl4ai.extraction_strategy import JsonCssExtractionStrategy, LLMExtractionStrategy # Import strategies
 from crawl4ai.content_filter_strategy import PruningContentFilter # Import content filter
+from crawl4ai.models import CrawlResult
+from crawler_pool import CrawlerPool, PoolNotReady, header_profile_key
+from extraction_cache import ExtractionCache, hash_instruction, hash_text, normalize_url
+from singleflight import SingleFlight
+from schema_registry import SchemaRegistry, records_of, shape_result
+from content_reduction import chunk_text, dedupe_chunked_result, estimate_tokens, html_to_compact_text, merge_extractions
+from http_fetcher import JS_SHELL_REASONS, FetchModeRegistry, HttpFetcher, domain_of, needs_browser
+from load_profiles import LOAD_PROFILES, on_page_context_created
+from job_queue import JobQueue, JobWorkerPool, QueueFull
+from politeness import DomainLimits, DomainScheduler, DomainStateStore, FairSlots
+from cpu_pool import CpuPool, next_page_link, prune_content, run_css_schema
+from page_fingerprints import FingerprintStore
+from failure_artifacts import FailureArtifactStore, crawl_result_dump, excerpt
+from metrics import (SCRAPES_IN_PROGRESS, JOB_QUEUE_DEPTH, CRAWLER_POOL_SIZE, MULTIPROCESS, StageTimer, current_timer,
+                     mark_process_dead, record_fallback, record_scrape, record_stage, refresh_memory_gauges, render_metrics, timed)
 from dotenv import load_dotenv
-import google.generativeai as genai
+import gemini_client
 import logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s') # Add timestamp and levelname
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s') # Add timestamp and levelname
 logger = logging.getLogger(__name__)
 
 # Load environment variables from .env file
@@ -21,6 +43,11 @@ load_dotenv()
 # --- Configuration ---
 GOOGLE_AI_API_KEY = os.getenv("GOOGLE_AI_API_KEY")
 
+# Local state (SQLite stores, failure artifacts) lives under DATA_DIR unless a store's own path is set,
+# so it stays out of the source tree and can be mounted as a volume
+DATA_DIR = os.getenv("DATA_DIR", "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
 if not GOOGLE_AI_API_KEY:
     logger.error("GOOGLE_AI_API_KEY environment variable not set.")
     # Depending on deployment strategy, you might want to raise an error or exit
@@ -29,13 +56,41 @@ if not GOOGLE_AI_API_KEY:
 # Configure Google Generative AI directly for testing
 if GOOGLE_AI_API_KEY:
     try:
-        genai.configure(api_key=GOOGLE_AI_API_KEY)
+        gemini_client.configure(GOOGLE_AI_API_KEY)
         logger.info("Google Generative AI configured successfully.")
     except Exception as e:
         logger.error(f"Failed to configure Google Generative AI: {e}")
 else:
     logger.warning("Google Generative AI not configured due to missing API key.")
 
+# Model used by LLMExtractionStrategy (a litellm provider/model string). LLM_BASE_URL optionally points it at
+# another OpenAI/Gemini-compatible endpoint, e.g. the benchmark stub (LLM_PROVIDER=openai/stub, LLM_BASE_URL=http://127.0.0.1:8090/v1)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini/gemini-1.5-flash")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+
+# Maximum number of URLs from a single /scrape/batch call crawled at the same time.
+# Callers can lower (but not raise) this per request via `concurrency`.
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "5"))
+# Maximum number of URLs accepted in a single /scrape/batch call; larger lists are rejected with 422
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", "100"))
+
+# LLM input size limits. Pages larger than LLM_CHUNK_TOKENS (after reduction to compact text)
+# are split into overlapping chunks that are sent to Gemini concurrently and merged.
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "12000"))
+LLM_CHUNK_OVERLAP_TOKENS = int(os.getenv("LLM_CHUNK_OVERLAP_TOKENS", "300"))
+LLM_CHUNK_CONCURRENCY = int(os.getenv("LLM_CHUNK_CONCURRENCY", "4"))
+
+# --- Diagnostics ---
+# CrawlResult dumps are only serialized when LOG_LEVEL=DEBUG (capped at LOG_DEBUG_DUMP_CHARS); otherwise logs
+# carry excerpts of at most LOG_EXCERPT_CHARS characters. A FAILURE_ARTIFACT_SAMPLE_RATE share of failed scrapes is dumped in full
+# to FAILURE_ARTIFACT_DIR, keeping the newest FAILURE_ARTIFACT_MAX_FILES dumps.
+LOG_EXCERPT_CHARS = int(os.getenv("LOG_EXCERPT_CHARS", "500"))
+LOG_DEBUG_DUMP_CHARS = int(os.getenv("LOG_DEBUG_DUMP_CHARS", "10000"))
+FAILURE_ARTIFACT_DIR = os.getenv("FAILURE_ARTIFACT_DIR", os.path.join(DATA_DIR, "failure_artifacts"))
+FAILURE_ARTIFACT_SAMPLE_RATE = float(os.getenv("FAILURE_ARTIFACT_SAMPLE_RATE", "0.1"))
+FAILURE_ARTIFACT_MAX_FILES = int(os.getenv("FAILURE_ARTIFACT_MAX_FILES", "200"))
+failure_artifacts = FailureArtifactStore(FAILURE_ARTIFACT_DIR, sample_rate=FAILURE_ARTIFACT_SAMPLE_RATE,
+                                         max_files=FAILURE_ARTIFACT_MAX_FILES)
 
 # --- Default Headers ---
 # Corrected dictionary formatting
@@ -56,36 +111,183 @@ DEFAULT_HEADERS = {
     'Sec-Ch-Ua-Platform': '"macOS"'
 }
 
-# --- Global Crawler Instance ---
-# We'll manage a single crawler instance for the app's lifetime
-crawler_instance: AsyncWebCrawler | None = None
+# --- Crawler Pool ---
+# One warm AsyncWebCrawler per header profile (the DEFAULT_HEADERS profile is always kept),
+# so per-request headers are honoured without running extra service containers.
+CRAWLER_POOL_MAX_SIZE = int(os.getenv("CRAWLER_POOL_MAX_SIZE", "4"))
+CRAWLER_POOL_IDLE_TTL = float(os.getenv("CRAWLER_POOL_IDLE_TTL", "600")) # Seconds before an idle profile is closed
+# Browsers are replaced (in the background, without dropping in-flight requests) after this many
+# navigations or once their processes exceed this much memory; 0 disables either limit
+CRAWLER_MAX_NAVIGATIONS = int(os.getenv("CRAWLER_MAX_NAVIGATIONS", "500"))
+CRAWLER_MAX_RSS_MB = float(os.getenv("CRAWLER_MAX_RSS_MB", "1500"))
+CRAWLER_CHECK_INTERVAL = float(os.getenv("CRAWLER_CHECK_INTERVAL", "30")) # Seconds between crash/memory checks
+# Seconds a request waits for the default browser to come up before it is answered with 503
+CRAWLER_READY_TIMEOUT = float(os.getenv("CRAWLER_READY_TIMEOUT", "60"))
+crawler_pool: CrawlerPool | None = None
+
+# Default page-load profile for browser navigations (see load_profiles.LOAD_PROFILES):
+# "full" loads everything, "no-media" blocks images/media/fonts and trackers, "minimal" also blocks CSS
+DEFAULT_LOAD_PROFILE = os.getenv("DEFAULT_LOAD_PROFILE", "no-media")
+
+# --- Extraction Result Cache ---
+# Caches final parsed LLM extraction results by (normalized URL, prompt hash, pruned content hash)
+# so unchanged pages don't pay for another Gemini call. Persisted in SQLite across restarts.
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", os.path.join(DATA_DIR, "extraction_cache.db"))
+EXTRACTION_CACHE_TTL = float(os.getenv("EXTRACTION_CACHE_TTL", str(7 * 24 * 3600))) # Seconds
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "10000"))
+extraction_cache: ExtractionCache | None = None
+
+# --- In-flight Request Coalescing ---
+# Identical scrapes (same URL, prompt/schema and header profile) that arrive while one is
+# running share its result instead of launching another navigation and LLM call.
+inflight_scrapes = SingleFlight()
+
+# --- Auto-schema Registry ---
+# CSS schemas learned from LLM extractions per page template, so later pages of the same
+# site go through the fast JsonCss path instead of calling Gemini. After a failed or rejected learning
+# attempt a template isn't retried for AUTO_SCHEMA_LEARN_COOLDOWN seconds (doubling per further failure).
+AUTO_SCHEMA_PATH = os.getenv("AUTO_SCHEMA_PATH", os.path.join(DATA_DIR, "auto_schemas.db"))
+AUTO_SCHEMA_LEARN_COOLDOWN = float(os.getenv("AUTO_SCHEMA_LEARN_COOLDOWN", str(24 * 3600)))
+schema_registry: SchemaRegistry | None = None
+
+# --- Plain-HTTP Fast Path ---
+# Server-rendered pages are fetched with a pooled HTTP client and extracted without a browser
+# navigation; the browser is only used when the HTML needs JS rendering or extraction comes back
+# empty. The mode that worked is remembered per domain for FETCH_MODE_TTL seconds.
+HTTP_FAST_PATH_ENABLED = os.getenv("HTTP_FAST_PATH_ENABLED", "true").lower() == "true"
+FETCH_MODE_TTL = float(os.getenv("FETCH_MODE_TTL", str(24 * 3600)))
+http_fetcher: HttpFetcher | None = None
+fetch_modes = FetchModeRegistry(ttl=FETCH_MODE_TTL)
+
+# --- Concurrency Limits / Job Queue ---
+# At most SCRAPE_MAX_CONCURRENCY scrapes (from /scrape, /scrape/batch and jobs together) run at once,
+# so load beyond what the browsers can handle waits instead of slowing every navigation down.
+SCRAPE_MAX_CONCURRENCY = int(os.getenv("SCRAPE_MAX_CONCURRENCY", "8"))
+scrape_slots = asyncio.Semaphore(SCRAPE_MAX_CONCURRENCY)
+# Asynchronous jobs (/jobs) are persisted in SQLite and drained by JOB_WORKERS workers;
+# submissions are rejected with 429 once JOB_QUEUE_MAX_DEPTH jobs are waiting.
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(DATA_DIR, "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Every serve.py worker process drains the same queue, so Retry-After is estimated from all of their job workers
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "500"))
+job_queue: JobQueue | None = None
+job_workers: JobWorkerPool | None = None
+
+# --- Per-domain Politeness ---
+# Token bucket + concurrency cap per domain with adaptive backoff on 429/503/CAPTCHA responses.
+# DOMAIN_LIMITS overrides the defaults per source, e.g. {"books.toscrape.com": {"rate": 5, "burst": 10, "concurrency": 4}}
+DOMAIN_DEFAULT_RATE = float(os.getenv("DOMAIN_DEFAULT_RATE", "1.0")) # Requests per second
+DOMAIN_DEFAULT_BURST = int(os.getenv("DOMAIN_DEFAULT_BURST", "3"))
+DOMAIN_DEFAULT_CONCURRENCY = int(os.getenv("DOMAIN_DEFAULT_CONCURRENCY", "2"))
+try:
+    DOMAIN_LIMITS = {domain: DomainLimits(**limits) for domain, limits in json.loads(os.getenv("DOMAIN_LIMITS", "{}")).items()}
+except (json.JSONDecodeError, TypeError, AttributeError) as e:
+    logger.error(f"Invalid DOMAIN_LIMITS, using defaults for every domain: {e}")
+    DOMAIN_LIMITS = {}
+# Buckets, backoff and concurrency slots are kept in DOMAIN_STATE_PATH (SQLite) so all worker processes on the host
+# honour the same per-domain limits; an empty DOMAIN_STATE_PATH keeps them in memory (only correct with one worker)
+DOMAIN_STATE_PATH = os.getenv("DOMAIN_STATE_PATH", os.path.join(DATA_DIR, "domain_state.db"))
+domain_state_store = DomainStateStore(DOMAIN_STATE_PATH) if DOMAIN_STATE_PATH else None
+domain_scheduler = DomainScheduler(
+    DomainLimits(rate=DOMAIN_DEFAULT_RATE, burst=DOMAIN_DEFAULT_BURST, concurrency=DOMAIN_DEFAULT_CONCURRENCY),
+    overrides=DOMAIN_LIMITS,
+    store=domain_state_store,
+)
+
+# --- Incremental Re-scrapes ---
+# For if_changed requests, the ETag/Last-Modified validators and a fingerprint of the pruned main content
+# of the last successful scrape are kept per (URL, prompt/schema). Re-scrapes send conditional requests and
+# answer unchanged=true without running extraction when neither the page nor its main content changed.
+PAGE_FINGERPRINTS_PATH = os.getenv("PAGE_FINGERPRINTS_PATH", os.path.join(DATA_DIR, "page_fingerprints.db"))
+fingerprint_store: FingerprintStore | None = None
+
+# --- Multi-worker Mode / CPU Offloading ---
+# serve.py runs WEB_CONCURRENCY worker processes. Each owns its crawler pool, HTTP client, job workers and scrape slots
+# (so CRAWLER_POOL_MAX_SIZE, SCRAPE_MAX_CONCURRENCY and JOB_WORKERS are per worker); the SQLite stores above and
+# crawl4ai's page cache are shared. Within a worker, HTML pruning, CSS extraction and page analysis run on
+# CPU_POOL_WORKERS processes instead of the event loop (0 runs them inline).
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", "2"))
+cpu_pool = CpuPool(CPU_POOL_WORKERS)
+
+# Strong references to fire-and-forget tasks (e.g. schema learning) so they aren't garbage collected
+background_tasks: set[asyncio.Task] = set()
 
 # --- Lifespan Management ---
 # Corrected indentation and structure
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global crawler_instance
-    logger.info("Application startup: Initializing global AsyncWebCrawler...")
-    # Initialize the crawler here - use a default config or load from env
-    # Using a basic config for now, adjust as needed
-    # Add --no-sandbox argument for Docker compatibility
-    browser_args = ["--no-sandbox"]
-    default_browser_config = BrowserConfig(
-        headless=True,
-        verbose=False,
-        headers=DEFAULT_HEADERS # Use default headers for the global instance
-        # Removed args=browser_args as it caused TypeError
+    global crawler_pool, extraction_cache, schema_registry, http_fetcher, job_queue, job_workers, fingerprint_store
+    if EXTRACTION_CACHE_ENABLED:
+        extraction_cache = ExtractionCache(EXTRACTION_CACHE_PATH, ttl=EXTRACTION_CACHE_TTL, max_entries=EXTRACTION_CACHE_MAX_ENTRIES)
+        logger.info(f"Extraction cache opened at {EXTRACTION_CACHE_PATH}")
+    schema_registry = SchemaRegistry(AUTO_SCHEMA_PATH, cpu_pool=cpu_pool, learn_cooldown=AUTO_SCHEMA_LEARN_COOLDOWN)
+    fingerprint_store = FingerprintStore(PAGE_FINGERPRINTS_PATH)
+    if HTTP_FAST_PATH_ENABLED:
+        http_fetcher = HttpFetcher(DEFAULT_HEADERS)
+    logger.info("Application startup: Initializing crawler pool...")
+    crawler_pool = CrawlerPool(
+        DEFAULT_HEADERS,
+        max_size=CRAWLER_POOL_MAX_SIZE,
+        idle_ttl=CRAWLER_POOL_IDLE_TTL,
+        hooks={"on_page_context_created": on_page_context_created}, # Applies the request's load profile
+        max_navigations=CRAWLER_MAX_NAVIGATIONS,
+        max_rss_mb=CRAWLER_MAX_RSS_MB,
+        check_interval=CRAWLER_CHECK_INTERVAL,
+        ready_timeout=CRAWLER_READY_TIMEOUT,
     )
-    crawler_instance = AsyncWebCrawler(config=default_browser_config)
     try:
-        await crawler_instance.start() # Start the crawler and browser
-        logger.info("Global AsyncWebCrawler started successfully.")
+        await crawler_pool.start() # Launches and warms the default-profile browser in the background (see /ready)
+        logger.info("Crawler pool started, warming up.")
+        job_queue = JobQueue(JOB_QUEUE_PATH)
+        job_workers = JobWorkerPool(job_queue, run_job, workers=JOB_WORKERS,
+                                    total_workers=JOB_WORKERS * WEB_CONCURRENCY)
+        job_workers.start()
+        logger.info(f"Job workers started ({JOB_WORKERS} workers, queue at {JOB_QUEUE_PATH}).")
+        if domain_state_store:
+            start_background_task(domain_state_store.renew_leases())
+        if MULTIPROCESS:
+            # Another worker may answer /metrics: keep this one's gauges current in the shared metric files
+            start_background_task(refresh_worker_gauges())
         yield # Application runs here
     finally:
-        logger.info("Application shutdown: Closing global AsyncWebCrawler...")
-        if crawler_instance:
-            await crawler_instance.close() # Ensure browser is closed
-        logger.info("Global AsyncWebCrawler closed.")
+        for task in list(background_tasks):
+            task.cancel()
+        if job_workers:
+            await job_workers.stop() # Unfinished jobs are re-queued once their heartbeat goes stale
+        if job_queue:
+            job_queue.close()
+        logger.info("Application shutdown: Closing crawler pool...")
+        if crawler_pool:
+            await crawler_pool.close() # Ensure all browsers are closed
+        logger.info("Crawler pool closed.")
+        if extraction_cache:
+            extraction_cache.close()
+        if schema_registry:
+            schema_registry.close()
+        if fingerprint_store:
+            fingerprint_store.close()
+        if http_fetcher:
+            await http_fetcher.close()
+        if domain_state_store:
+            domain_state_store.close()
+        cpu_pool.close()
+        mark_process_dead()
+
+
+def start_background_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def refresh_worker_gauges():
+    while True:
+        CRAWLER_POOL_SIZE.set(crawler_pool.stats()["size"] if crawler_pool else 0)
+        await asyncio.to_thread(refresh_memory_gauges)
+        await asyncio.sleep(CRAWLER_CHECK_INTERVAL)
 
 
 # --- FastAPI App ---
@@ -102,6 +304,12 @@ class ScrapeRequest(BaseModel):
     prompt: str | None = Field(default=None, description="The prompt for LLM-based data extraction.")
     schema: dict | None = Field(default=None, description="The CSS selector schema for direct extraction.")
     headers: dict | None = Field(default=None, description="Optional headers to use for the request.")
+    bypass_cache: bool = Field(default=False, description="Skip the extraction result cache and always run the extraction.")
+    auto_schema: bool = Field(default=False, description="LLM path only: learn a CSS schema for this page template and use it for later pages.")
+    fetch_mode: Literal["auto", "http", "browser"] = Field(default="auto", description="'auto' tries plain HTTP first and escalates to the browser when needed.")
+    load_profile: Literal["minimal", "no-media", "full"] | None = Field(default=None, description="Resources to load in the browser (defaults to DEFAULT_LOAD_PROFILE).")
+    if_changed: bool = Field(default=False, description="Return unchanged=true without extracting when the page hasn't changed since the last if_changed scrape.")
+    extracted_only: bool = Field(default=False, description="/scrape only: respond with just the extracted data (failures become HTTP 502).")
     # Add any other Crawl4AI options you might want to expose, e.g., timeout
     # timeout: int | None = Field(default=30, description="Timeout in seconds for the crawl.")
 
@@ -116,6 +324,93 @@ class ScrapeResponse(BaseModel):
     success: bool
     data: dict | list | None = None # Allow list for potential multi-item extractions
     error: str | None = None
+    cached: bool = False # True when data was served from the extraction result cache
+    unchanged: bool = False # True (with data=None) when an if_changed scrape found the page unchanged
+    metadata: dict = Field(default_factory=dict) # e.g. extraction_mode
+    _page: "FetchedPage | None" = PrivateAttr(default=None) # The page the data was extracted from (not serialized)
+
+class ScrapeBatchRequest(BaseModel):
+    urls: list[str] = Field(..., min_length=1, max_length=BATCH_MAX_URLS, description="The URLs of the web pages to scrape (at most BATCH_MAX_URLS).")
+    prompt: str | None = Field(default=None, description="The prompt for LLM-based data extraction, shared by all URLs.")
+    schema: dict | None = Field(default=None, description="The CSS selector schema for direct extraction, shared by all URLs.")
+    headers: dict | None = Field(default=None, description="Optional headers to use for the requests.")
+    concurrency: int | None = Field(default=None, ge=1, description="Maximum number of URLs crawled at the same time (capped by the server).")
+    bypass_cache: bool = Field(default=False, description="Skip the extraction result cache and always run the extraction.")
+    auto_schema: bool = Field(default=False, description="LLM path only: learn a CSS schema for this page template and use it for later pages.")
+    fetch_mode: Literal["auto", "http", "browser"] = Field(default="auto", description="'auto' tries plain HTTP first and escalates to the browser when needed.")
+    load_profile: Literal["minimal", "no-media", "full"] | None = Field(default=None, description="Resources to load in the browser (defaults to DEFAULT_LOAD_PROFILE).")
+    if_changed: bool = Field(default=False, description="Skip extraction for URLs that haven't changed since their last if_changed scrape.")
+    only_changed: bool = Field(default=False, description="Implies if_changed; leave unchanged URLs out of the results (they are only counted).")
+
+class ScrapeBatchItem(BaseModel):
+    url: str
+    success: bool
+    data: dict | list | None = None
+    error: str | None = None
+    cached: bool = False
+    unchanged: bool = False
+    metadata: dict = Field(default_factory=dict)
+
+class ScrapeBatchResponse(BaseModel):
+    success: bool # True when every URL succeeded
+    succeeded: int = 0 # Includes unchanged URLs
+    failed: int = 0
+    unchanged: int = 0
+    results: list[ScrapeBatchItem] = []
+
+class JobRequest(ScrapeRequest):
+    webhook_url: str | None = Field(default=None, description="Optional URL that receives the final job status as a POST.")
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    queue_depth: int
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str # queued, running, succeeded or failed
+    result: ScrapeResponse | None = None
+    error: str | None = None
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    attempts: int = 0
+
+class ListingCrawlRequest(BaseModel):
+    url: str = Field(..., description="The first listing page.")
+    listing_prompt: str | None = Field(default=None, description="LLM prompt extracting the listing items.")
+    listing_schema: dict | None = Field(default=None, description="CSS schema extracting the listing items.")
+    detail_prompt: str | None = Field(default=None, description="LLM prompt for detail pages (omit both detail fields to only collect links).")
+    detail_schema: dict | None = Field(default=None, description="CSS schema for detail pages.")
+    link_field: str = Field(default="url", description="Listing item field holding the (possibly relative) detail page link.")
+    next_page_selector: str | None = Field(default=None, description="CSS selector of the 'next page' link, followed up to max_pages.")
+    page_url_template: str | None = Field(default=None, description="Alternative to next_page_selector (not both): URL (absolute or relative to url) with a {page} placeholder for pages 2..max_pages (crawled concurrently).")
+    max_pages: int = Field(default=1, ge=1, le=100)
+    max_details: int | None = Field(default=None, ge=0, description="Maximum number of detail pages to crawl.")
+    known_urls: list[str] = Field(default_factory=list, description="Detail URLs the caller already has; these are skipped.")
+    headers: dict | None = None
+    bypass_cache: bool = False
+    auto_schema: bool = False
+    fetch_mode: Literal["auto", "http", "browser"] = "auto"
+    load_profile: Literal["minimal", "no-media", "full"] | None = None
+    concurrency: int | None = Field(default=None, ge=1, description="Maximum detail pages crawled at the same time (capped by the server).")
+    stream: bool = Field(default=False, description="Stream records as NDJSON as they complete, followed by a summary line.")
+    if_changed: bool = Field(default=False, description="Skip extraction for detail pages that haven't changed since their last if_changed scrape.")
+
+class ListingRecord(BaseModel):
+    url: str | None = None # Absolute detail page URL
+    listing: dict # The listing item as extracted from the listing page
+    detail: dict | list | None = None
+    unchanged: bool = False # Detail page unchanged since the last if_changed crawl (detail is None)
+    success: bool = True
+    error: str | None = None
+
+class ListingCrawlResponse(BaseModel):
+    success: bool # True when every listing page and detail page succeeded
+    pages_crawled: int
+    skipped_known: int
+    records: list[ListingRecord]
+    errors: list[str] = []
 
 class GeminiTestResponse(BaseModel):
     success: bool
@@ -125,11 +420,140 @@ class GeminiTestResponse(BaseModel):
 
 # --- API Endpoints ---
 @app.post("/scrape", response_model=ScrapeResponse)
-async def scrape_url(request: ScrapeRequest):
+async def scrape_url(request: ScrapeRequest, http_response: Response):
     """
     Scrapes the given URL using Crawl4AI based on the provided prompt.
+    Per-stage timings are returned in metadata.timings_ms and as a Server-Timing header.
     """
     logger.info(f"Received scrape request for URL: {request.url}")
+    timer = StageTimer()
+    token = current_timer.set(timer)
+    start = time.perf_counter()
+    try:
+        response = await run_scrape(request)
+    finally:
+        current_timer.reset(token)
+    timer.add("total", time.perf_counter() - start)
+    http_response.headers["Server-Timing"] = timer.server_timing()
+    if request.extracted_only:
+        if not response.success:
+            raise HTTPException(status_code=502, detail=response.error or "Scrape failed", headers={"Server-Timing": timer.server_timing()})
+        return JSONResponse(content=response.data, headers={"Server-Timing": timer.server_timing()})
+    # Coalesced callers share one response object, so the timings go on a copy
+    return response.copy(update={"metadata": {**response.metadata, "timings_ms": timer.as_dict()}})
+
+
+@app.post("/scrape/batch", response_model=ScrapeBatchResponse)
+async def scrape_batch(request: ScrapeBatchRequest):
+    """
+    Scrapes many URLs with one shared prompt or schema.
+    URLs are crawled concurrently on the pooled crawlers (bounded by BATCH_MAX_CONCURRENCY);
+    a failure on one URL is reported in its own result and does not fail the batch.
+    """
+    logger.info(f"Received batch scrape request for {len(request.urls)} URLs")
+    if not request.prompt and not request.schema:
+        raise HTTPException(status_code=400, detail="Either prompt or schema must be provided")
+
+    concurrency = min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    # A paused domain waits out its backoff before taking a batch slot; fetches are capped per domain in fetch_page
+    batch_slots = FairSlots(domain_scheduler, concurrency)
+
+    async def scrape_item(url: str) -> ScrapeBatchItem:
+        item_request = ScrapeRequest(url=url, prompt=request.prompt, schema=request.schema, headers=request.headers,
+                                     bypass_cache=request.bypass_cache, auto_schema=request.auto_schema,
+                                     fetch_mode=request.fetch_mode, load_profile=request.load_profile,
+                                     if_changed=request.if_changed or request.only_changed)
+        async with batch_slots.slot(url):
+            try:
+                response = await run_scrape(item_request)
+                return ScrapeBatchItem(url=url, success=response.success, data=response.data, error=response.error,
+                                       cached=response.cached, unchanged=response.unchanged, metadata=response.metadata)
+            except HTTPException as e:
+                logger.error(f"Batch item {url} failed: {e.detail}")
+                return ScrapeBatchItem(url=url, success=False, error=str(e.detail))
+            except Exception as e:
+                logger.exception(f"Unexpected error scraping batch item {url}")
+                return ScrapeBatchItem(url=url, success=False, error=f"Internal Server Error: {str(e)}")
+
+    results = await asyncio.gather(*(scrape_item(url) for url in request.urls))
+    succeeded = sum(1 for item in results if item.success)
+    unchanged = sum(1 for item in results if item.unchanged)
+    logger.info(f"Batch scrape finished: {succeeded}/{len(results)} URLs succeeded, {unchanged} unchanged (concurrency {concurrency})")
+    return ScrapeBatchResponse(
+        success=succeeded == len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        unchanged=unchanged,
+        results=[item for item in results if not (request.only_changed and item.unchanged)],
+    )
+
+
+async def run_scrape(request: ScrapeRequest) -> ScrapeResponse:
+    """
+    Runs a single scrape, coalesced with any identical scrape already in flight.
+    Shared by /scrape and /scrape/batch. Callers that joined another request's scrape get
+    metadata.coalesced=true: their own timings only cover waiting for it (no fetch or extraction stages).
+    """
+    flight_key = "|".join([
+        normalize_url(request.url),
+        hash_instruction(request.prompt, request.schema),
+        header_profile_key(request.headers or DEFAULT_HEADERS),
+        "bypass" if request.bypass_cache else "cache",
+        "auto" if request.auto_schema else "manual",
+        request.fetch_mode,
+        request.load_profile or DEFAULT_LOAD_PROFILE,
+        "if_changed" if request.if_changed else "always",
+    ])
+    coalesced = inflight_scrapes.in_flight(flight_key)
+    response = await inflight_scrapes.do(flight_key, lambda: execute_scrape_limited(request))
+    if coalesced:
+        # The response object is shared with the request that ran the scrape, so the flag goes on a copy
+        return response.copy(update={"metadata": {**response.metadata, "coalesced": True}})
+    return response
+
+
+async def execute_scrape_limited(request: ScrapeRequest) -> ScrapeResponse:
+    """
+    Runs execute_scrape once a global scrape slot is free. Per-domain politeness only gates the
+    network fetches (see fetch_page), not extraction, so LLM calls for one site still run in parallel.
+    """
+    async with AsyncExitStack() as slots:
+        queued_at = time.perf_counter()
+        with SCRAPES_IN_PROGRESS.labels("waiting").track_inprogress():
+            # A paused domain doesn't take a global slot until its backoff is over
+            await domain_scheduler.wait_until_open(domain_of(request.url))
+            await slots.enter_async_context(scrape_slots)
+        record_stage("queue", time.perf_counter() - queued_at)
+        started_at = time.perf_counter()
+        response = None
+        try:
+            with SCRAPES_IN_PROGRESS.labels("running").track_inprogress():
+                response = await execute_scrape(request)
+            if response._page:
+                # The response keeps the page HTML (pagination, fingerprints) but not the full CrawlResult
+                # with its markdown, links and media, which batches and coalesced callers would hold on to
+                response._page.crawl_result = None
+        finally:
+            record_scrape(domain_of(request.url), scrape_outcome(response),
+                          response.metadata.get("extraction_mode") if response else None,
+                          time.perf_counter() - started_at)
+    if request.if_changed:
+        await remember_fingerprint(request, response)
+    return response
+
+
+def scrape_outcome(response: ScrapeResponse | None) -> str:
+    if response is None or not response.success or response.error:
+        return "failure"
+    if response.unchanged:
+        return "unchanged"
+    return "cached" if response.cached else "success"
+
+
+async def execute_scrape(request: ScrapeRequest) -> ScrapeResponse:
+    """
+    Runs a single scrape (crawl + extraction) on the pooled crawler for the request's headers.
+    """
 
     # Validate request (ensure prompt or schema is present)
     try:
@@ -143,19 +567,16 @@ async def scrape_url(request: ScrapeRequest):
     logger.info(f"Extraction method: {'CSS Schema' if use_schema else 'LLM Prompt'}")
 
     # --- Prepare Crawler Configuration for this specific request ---
-    # Note: We use the global crawler_instance, but configure the run with request-specific details
+    # Note: Headers are part of the BrowserConfig, so the crawler for this run is taken
+    # from the pool entry matching the header profile (the default profile if none given)
 
     # Prioritize headers from request for this specific run, fallback to defaults
     request_headers = request.headers if request.headers else DEFAULT_HEADERS
-    logger.info(f"Using headers for this run: {json.dumps(request_headers)}")
-    # TODO: Currently, crawl4ai doesn't easily support overriding headers per-run
-    # if using a single browser instance. We might need to adjust BrowserConfig
-    # or accept that the global instance's headers are used.
-    # For now, we log the requested headers but the global instance's headers apply.
+    logger.debug(f"Using headers for this run: {request_headers}")
 
     extraction_strategy = None
     if use_schema:
-        logger.info(f"Using CSS Schema: {json.dumps(request.schema)}")
+        logger.debug(f"Using CSS Schema: {excerpt(request.schema, LOG_EXCERPT_CHARS)}")
         extraction_strategy = JsonCssExtractionStrategy(schema=request.schema, verbose=False)
     else:
         # LLM Extraction Path
@@ -171,8 +592,9 @@ async def scrape_url(request: ScrapeRequest):
         # Define LLM extraction strategy with content filtering using LLMConfig
         # Revert to provider/model format based on GitHub issue
         llm_config = LLMConfig(
-            provider="gemini/gemini-1.5-flash",
-            api_token=GOOGLE_AI_API_KEY
+            provider=LLM_PROVIDER,
+            api_token=GOOGLE_AI_API_KEY,
+            base_url=LLM_BASE_URL,
         )
         extraction_strategy = LLMExtractionStrategy(
             llm_config=llm_config, # Use the llm_config parameter
@@ -188,31 +610,65 @@ IMPORTANT: If the USER PROMPT asks for a list/array, ensure the JSON output is s
 """,
             # Keep content filter
             content_filter=PruningContentFilter(threshold=0.5, threshold_type="relative", min_word_threshold=50),
+            # Split oversized pages instead of sending one huge prompt (chunks are extracted in parallel)
+            apply_chunking=True,
+            chunk_token_threshold=LLM_CHUNK_TOKENS,
+            overlap_rate=LLM_CHUNK_OVERLAP_TOKENS / LLM_CHUNK_TOKENS,
             response_format={"type": "json_object"} # Keep forcing JSON output
         )
 
-    # Common run configuration
-    run_config = CrawlerRunConfig(
-        cache_mode=CacheMode.ENABLED, # Enable caching
-        extraction_strategy=extraction_strategy,
-        # Add other run configs if needed (e.g., timeout)
-    )
+    # Run configurations are built per step: fetch_page() navigates with the page cache enabled,
+    # extract_from_html() runs extraction_strategy over the fetched HTML
 
     # --- Execute Crawl ---
-    global crawler_instance
-    if not crawler_instance:
+    if not crawler_pool:
         # This shouldn't happen if lifespan management is working
-        logger.error("Global crawler instance not available!")
+        logger.error("Crawler pool not available!")
         raise HTTPException(status_code=500, detail="Internal Server Error: Crawler not initialized")
 
+    cache_key = None
     try:
-        # Use the global crawler instance to run the scrape
-        # Pass the request-specific run_config
-        result = await crawler_instance.arun(
-            url=request.url,
-            config=run_config
-        )
+        # Use the pooled crawler for this header profile to run the scrape
+        acquire_started = time.perf_counter()
+        async with crawler_pool.acquire(request_headers) as crawler:
+            record_stage("crawler_acquire", time.perf_counter() - acquire_started)
+            page = None
+            # --- Incremental re-scrape: stop here if the page hasn't changed since the last scrape ---
+            if request.if_changed and fingerprint_store:
+                unchanged_response, page = await check_unchanged(request, crawler)
+                if unchanged_response:
+                    return unchanged_response
+
+            # --- Auto-schema: serve the page through a CSS schema learned for this page template ---
+            if not use_schema and request.auto_schema and schema_registry:
+                learned = await schema_registry.get(request.url, request.prompt)
+                if learned:
+                    response, page = await scrape_with_learned_schema(request, learned, crawler, page)
+                    if response:
+                        return response
+
+            if not use_schema and extraction_cache and not request.bypass_cache:
+                # Fetch the page first so the extraction cache can be checked before calling the LLM
+                page = page or await fetch_page(request, crawler)
+                if page.html:
+                    cache_key = await extraction_cache_key(request, page)
+                    with timed("cache_lookup"):
+                        cached_data = await extraction_cache.get(cache_key)
+                    if cached_data is not None:
+                        logger.info(f"Extraction cache hit for {request.url}") # Already learned from when it was extracted
+                        response = ScrapeResponse(success=True, data=cached_data, cached=True,
+                                                  metadata={"extraction_mode": "llm", "fetch_mode": page.mode})
+                        response._page = page
+                        return response
+                    logger.info(f"Extraction cache miss for {request.url}")
+            result, page = await crawl_page(request, crawler, extraction_strategy, page)
+            if cache_key and page.html:
+                # The page may have been re-fetched in the browser: key the stored result on the final content
+                cache_key = await extraction_cache_key(request, page)
     # --- Specific Error Handling for crawl4ai internal errors ---
+    except PoolNotReady as e:
+        logger.error(f"Crawler pool not ready for {request.url}: {e}")
+        raise HTTPException(status_code=503, detail=f"Service warming up: {e}", headers={"Retry-After": "10"})
     except AttributeError as ae:
         # Catch errors like 'str' object has no attribute 'choices' which might occur inside crawl4ai
         logger.error(f"AttributeError during crawl4ai execution for {request.url}: {ae}", exc_info=True)
@@ -225,34 +681,320 @@ IMPORTANT: If the USER PROMPT asks for a list/array, ensure the JSON output is s
 
 
     # --- Process Result (only if crawl execution didn't raise an exception) ---
+    response = await process_crawl_result(request, result, use_schema)
+    if not response.success or response.error:
+        await failure_artifacts.maybe_save(request.url, response.error, result,
+                                           {"prompt": request.prompt, "schema": request.schema, "fetch_mode": page.mode})
+    response.metadata.setdefault("extraction_mode", "css_schema" if use_schema else "llm")
+    response.metadata["fetch_mode"] = page.mode
+    response._page = page
+    if page.resource_stats:
+        response.metadata["resources"] = page.resource_stats
+    if not use_schema and "tokens" not in response.metadata and getattr(result, 'html', None):
+        # Report how much the markdown conversion/pruning shrank the LLM input
+        markdown = getattr(result, 'markdown', None)
+        response.metadata["tokens"] = {
+            "before_reduction": estimate_tokens(result.html),
+            "after_reduction": estimate_tokens(str(markdown)) if markdown else None,
+        }
+    if not use_schema and response.success and response.data is not None and not response.error and not response.metadata.get("partial"):
+        if cache_key:
+            await extraction_cache.put(cache_key, request.url, response.data)
+        if request.auto_schema and getattr(result, 'html', None):
+            schedule_schema_learning(request, result.html, response.data)
+    return response
+
+
+async def scrape_with_learned_schema(request: ScrapeRequest, learned: dict, crawler: AsyncWebCrawler,
+                                     page: "FetchedPage | None" = None) -> tuple[ScrapeResponse | None, "FetchedPage | None"]:
+    """
+    Runs the cheap JsonCss path with a learned schema. Returns no response (and counts a failure
+    against the schema) when the crawl fails or the fields come back empty, so the caller
+    falls back to the LLM, which then regenerates the schema. The fetched page is returned
+    either way so the fallback doesn't download it again.
+    """
+    schema, shape = learned["schema"], learned["shape"]
+    logger.info(f"Using learned CSS schema for {request.url}")
+    extraction_strategy = JsonCssExtractionStrategy(schema=schema, verbose=False)
     try:
-        extracted_data = None # Define extracted_data at the start of the block
-        # Log raw result (carefully)
+        # Empty fields mark the schema stale (it is re-learned from the LLM fallback), not the page as needing a browser
+        result, page = await crawl_page(request, crawler, extraction_strategy, page, escalate=False)
+        response = await process_crawl_result(request, result, use_schema=True)
+    except Exception as e:
+        logger.error(f"Learned CSS schema crawl failed for {request.url}, falling back to LLM: {e}")
+        record_fallback("auto_schema_to_llm")
+        return None, None
+
+    records = records_of(response.data, "items") if response.success else []
+    if shape == "object":
+        records = records[:1]
+    if schema_registry.validate_records(records, schema):
+        await schema_registry.record(request.url, request.prompt, ok=True)
+        response = ScrapeResponse(success=True, data=shape_result(records, shape),
+                                  metadata={"extraction_mode": "auto_schema", "fetch_mode": page.mode})
+        response._page = page
+        return response, page
+
+    logger.warning(f"Learned CSS schema returned empty fields for {request.url}, falling back to LLM")
+    record_fallback("auto_schema_to_llm")
+    await schema_registry.record(request.url, request.prompt, ok=False)
+    return None, page if page and page.html else None
+
+
+def schedule_schema_learning(request: ScrapeRequest, html: str, data):
+    """Learns a CSS schema from an LLM result in the background, off the request's critical path."""
+    if not schema_registry:
+        return
+    start_background_task(schema_registry.learn(request.url, request.prompt, html, data, 'gemini-1.5-flash'))
+
+
+@dataclass
+class FetchedPage:
+    html: str | None
+    mode: str # "http" or "browser"
+    crawl_result: object = None # The browser CrawlResult (kept to report crawl failures)
+    resource_stats: dict | None = None # Requests blocked by the load profile (browser only)
+    etag: str | None = None
+    last_modified: str | None = None
+    not_modified: bool = False # The server answered a conditional request with 304 (html is None)
+    fingerprint: str | None = None # Hash of the pruned main content, computed on first use (see page_fingerprint)
+
+
+def header_value(headers: dict | None, name: str) -> str | None:
+    """Case-insensitive response header lookup."""
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+@asynccontextmanager
+async def domain_slot(url: str):
+    """Holds the URL's domain concurrency slot and a rate token for one network fetch (the wait is timed as domain_wait)."""
+    waited_at = time.perf_counter()
+    async with domain_scheduler.slot(url):
+        record_stage("domain_wait", time.perf_counter() - waited_at)
+        yield
+
+
+async def fetch_page(request: ScrapeRequest, crawler: AsyncWebCrawler, force_browser: bool = False,
+                     conditional: dict | None = None) -> FetchedPage:
+    """
+    Fetches the page HTML without extraction: with the pooled HTTP client when the request/domain
+    allows it and the HTML looks server-rendered, otherwise with a browser navigation.
+    `conditional` (If-None-Match / If-Modified-Since) is sent with plain HTTP fetches; a 304
+    answer is returned as a page with not_modified=True, and an error status fails the page. Each
+    request to the site (HTTP GET or navigation) holds a domain slot and takes a rate token.
+    """
+    domain = domain_of(request.url)
+    mode = "browser" if force_browser or not http_fetcher else request.fetch_mode
+    if mode == "auto":
+        mode = fetch_modes.get(domain) or "http" # Unknown domains are probed with plain HTTP first
+
+    if mode == "http":
+        try:
+            async with domain_slot(request.url):
+                with timed("fetch_http"):
+                    fetched = await http_fetcher.fetch(request.url, {**(request.headers or {}), **(conditional or {})})
+            if await domain_scheduler.report(request.url, fetched.status_code, fetched.html, fetched.headers.get("retry-after")):
+                # The domain is now paused: a browser navigation right away would ignore the backoff just set
+                raise ValueError(f"Plain HTTP fetch was throttled by the site (HTTP status {fetched.status_code}), domain paused")
+            etag, last_modified = header_value(fetched.headers, "etag"), header_value(fetched.headers, "last-modified")
+            if fetched.status_code == 304:
+                return FetchedPage(html=None, mode="http", etag=etag, last_modified=last_modified, not_modified=True)
+            if fetched.status_code >= 400:
+                # An error status fails this page; a browser would get the same answer from the server
+                raise ValueError(f"Plain HTTP fetch failed: HTTP status {fetched.status_code}")
+            reason = await cpu_pool.run(needs_browser, fetched.html)
+            if reason is None or request.fetch_mode == "http":
+                return FetchedPage(html=fetched.html, mode="http", etag=etag, last_modified=last_modified)
+            logger.info(f"Plain HTTP fetch of {request.url} not usable ({reason}), escalating to browser")
+            if reason in JS_SHELL_REASONS:
+                # Only a client-rendered page says the whole domain needs the browser
+                fetch_modes.set(domain, "browser")
+        except httpx.HTTPError as e:
+            if request.fetch_mode == "http":
+                raise
+            # Network errors are usually transient: retry this page in the browser without switching the domain
+            logger.info(f"Plain HTTP fetch of {request.url} failed ({e}), escalating to browser")
+        record_fallback("browser_escalation")
+
+    profile_name = request.load_profile or DEFAULT_LOAD_PROFILE
+    profile = LOAD_PROFILES.get(profile_name, LOAD_PROFILES["full"])
+    # shared_data is handed to the on_page_context_created hook, which installs the route blocking
+    shared_data = {"load_profile": profile_name}
+    run_kwargs = {"wait_for": profile["wait_for"]} if profile["wait_for"] else {}
+    # if_changed scrapes must see the live page, not crawl4ai's cached copy
+    cache_mode = CacheMode.BYPASS if request.if_changed else CacheMode.ENABLED
+    crawler_pool.count_navigation(crawler)
+    async with domain_slot(request.url):
+        with timed("navigate"):
+            page_result = await crawler.arun(
+                url=request.url,
+                config=CrawlerRunConfig(cache_mode=cache_mode, shared_data=shared_data, **run_kwargs),
+            )
+    html = getattr(page_result, 'html', None) if page_result and getattr(page_result, 'success', False) else None
+    await domain_scheduler.report(request.url, getattr(page_result, 'status_code', None), html)
+    resource_stats = shared_data.get("resource_stats")
+    if resource_stats:
+        logger.info(f"Load profile '{profile_name}' blocked {resource_stats['blocked_requests']} requests for {request.url}")
+    response_headers = getattr(page_result, 'response_headers', None)
+    return FetchedPage(html=html, mode="browser", crawl_result=page_result, resource_stats=resource_stats,
+                       etag=header_value(response_headers, "etag"), last_modified=header_value(response_headers, "last-modified"))
+
+
+async def extract_from_html(crawler: AsyncWebCrawler, url: str, html: str, extraction_strategy):
+    """
+    Runs the extraction strategy over already-fetched HTML (crawl4ai raw: fast path, no navigation).
+    CSS schemas only parse the HTML, so they run on the CPU pool and their records are wrapped in a CrawlResult.
+    """
+    if isinstance(extraction_strategy, JsonCssExtractionStrategy):
+        with timed("extraction"):
+            try:
+                records = await cpu_pool.run(run_css_schema, extraction_strategy.schema, url, html)
+            except Exception as e:
+                return CrawlResult(url=url, html=html, success=False, error_message=f"CSS extraction failed: {e}")
+        return CrawlResult(url=url, html=html, success=True, extracted_content=json.dumps(records, ensure_ascii=False, default=str))
+    run_config = CrawlerRunConfig(
+        cache_mode=CacheMode.BYPASS,
+        extraction_strategy=extraction_strategy,
+        base_url=url, # Resolve relative links against the real page URL
+    )
+    with timed("extraction"):
+        return await crawler.arun(url="raw:" + html, config=run_config)
+
+
+def extraction_is_empty(result) -> bool:
+    """True if a crawl failed or its extraction found nothing (null, [], {} or {"items": []})."""
+    if not result or not getattr(result, 'success', False):
+        return True
+    content = getattr(result, 'extracted_content', None)
+    if isinstance(content, str):
         try:
-            result_dict = result.to_dict() if result and hasattr(result, 'to_dict') else repr(result)
-            logger.info(f"Raw CrawlResult object: {json.dumps(result_dict, default=str, indent=2)}")
-        except Exception as log_e:
-            logger.error(f"Could not serialize/log full CrawlResult object: {log_e}")
-            logger.info(f"Raw CrawlResult object (repr): {repr(result)}")
+            content = json.loads(content)
+        except json.JSONDecodeError:
+            return not content.strip()
+    if isinstance(content, dict) and "items" in content:
+        content = content["items"]
+    return not content
+
+
+async def crawl_page(request: ScrapeRequest, crawler: AsyncWebCrawler, extraction_strategy, page: FetchedPage | None = None,
+                     escalate: bool = True):
+    """
+    Fetches (unless `page` is given) and extracts a page. Pages fetched over plain HTTP are
+    escalated to a browser navigation when extraction comes back empty (auto mode only), and the
+    outcome is remembered as the domain's fetch mode. With escalate=False (learned schemas, whose
+    empty results mean the schema is stale rather than the page unrendered) neither happens.
+    Returns the CrawlResult and the FetchedPage it was extracted from.
+    """
+    if page is None:
+        page = await fetch_page(request, crawler)
+    if not page.html:
+        # Browser navigation failed: hand the failed CrawlResult to result processing
+        return page.crawl_result, page
+
+    result = await extract_from_html(crawler, request.url, page.html, extraction_strategy)
+    if escalate and page.mode == "http" and request.fetch_mode == "auto":
+        domain = domain_of(request.url)
+        if not extraction_is_empty(result):
+            fetch_modes.set(domain, "http")
+        else:
+            logger.info(f"Extraction from plain HTTP fetch of {request.url} was empty, escalating to browser")
+            fetch_modes.set(domain, "browser")
+            record_fallback("browser_escalation")
+            page = await fetch_page(request, crawler, force_browser=True) # Takes its own domain slot and token
+            if not page.html:
+                return page.crawl_result, page
+            result = await extract_from_html(crawler, request.url, page.html, extraction_strategy)
+    return result, page
+
+
+async def extraction_cache_key(request: ScrapeRequest, page: FetchedPage) -> str:
+    return ExtractionCache.make_key(request.url, hash_instruction(request.prompt, None), await page_fingerprint(page))
+
+
+async def page_fingerprint(page: FetchedPage) -> str:
+    """Hash of the page's pruned main content (computed once per fetched page)."""
+    if page.fingerprint is None:
+        page.fingerprint = hash_text(await pruned_page_text(page.html))
+    return page.fingerprint
+
+
+async def check_unchanged(request: ScrapeRequest, crawler: AsyncWebCrawler) -> tuple[ScrapeResponse | None, FetchedPage]:
+    """
+    Fetches the page conditionally against the validators stored by the last if_changed scrape.
+    Returns an unchanged response when the server answers 304 or the pruned main content has the
+    same fingerprint; otherwise no response and the fetched page, which the scrape goes on to use.
+    """
+    previous = await fingerprint_store.get(request.url, hash_instruction(request.prompt, request.schema))
+    page = await fetch_page(request, crawler, conditional=FingerprintStore.conditional_headers(previous))
+    reason = None
+    if page.not_modified and previous:
+        reason = "not_modified"
+    elif page.html and previous and await page_fingerprint(page) == previous["fingerprint"]:
+        reason = "same_content"
+        # Keep the validators current so the next re-scrape can be answered with a 304
+        await fingerprint_store.put(request.url, hash_instruction(request.prompt, request.schema),
+                                    page.etag, page.last_modified, previous["fingerprint"])
+    if reason is None:
+        return None, page
+    logger.info(f"Page unchanged since last scrape ({reason}), skipping extraction for {request.url}")
+    response = ScrapeResponse(success=True, unchanged=True,
+                              metadata={"fetch_mode": page.mode, "unchanged_reason": reason})
+    response._page = page
+    return response, page
+
+
+async def remember_fingerprint(request: ScrapeRequest, response: ScrapeResponse):
+    """Stores the validators and content fingerprint of a successful if_changed scrape."""
+    page = response._page
+    if not fingerprint_store or response.unchanged or not response.success or response.error or not page or not page.html:
+        return
+    await fingerprint_store.put(request.url, hash_instruction(request.prompt, request.schema),
+                                page.etag, page.last_modified, await page_fingerprint(page))
+
+
+async def pruned_page_text(html: str) -> str:
+    """
+    Main page content after the same pruning used for LLM extraction (on the CPU pool).
+    Used to fingerprint pages so cosmetic changes (ads, scripts, session tokens) don't bust caches.
+    """
+    try:
+        with timed("content_filter"):
+            chunks = await cpu_pool.run(prune_content, html)
+        return "\n".join(chunks) if chunks else html
+    except Exception as e:
+        logger.warning(f"Content pruning failed, fingerprinting raw HTML instead: {e}")
+        return html
+
+
+async def process_crawl_result(request: ScrapeRequest, result, use_schema: bool) -> ScrapeResponse:
+    """
+    Turns a CrawlResult into a ScrapeResponse: checks crawl success, parses the extracted content
+    and, for the LLM path, retries with a direct Gemini call when extraction returned no usable JSON.
+    """
+    try:
+        extracted_data = None # Define extracted_data at the start of the block
+        # Log raw result (serialized only when debug logging is on; failures can be dumped in full as artifacts)
+        if logger.isEnabledFor(logging.DEBUG):
+            with timed("result_logging"):
+                logger.debug(f"Raw CrawlResult object: {excerpt(json.dumps(crawl_result_dump(result), default=str), LOG_DEBUG_DUMP_CHARS)}")
 
         # Check for explicit crawl failure reported by crawl4ai
         # Check result existence and success attribute first
         if not result or not getattr(result, 'success', False):
-            # Log the whole result object (as dict if possible) to see available info
-            try:
-                result_info = result.to_dict() if result and hasattr(result, 'to_dict') else repr(result)
-                error_message = f"Crawl failed. Result: {json.dumps(result_info, default=str)}"
-            except Exception:
-                 error_message = f"Crawl failed. Result: {repr(result)}"
-            logger.error(f"Crawl4ai reported failure for {request.url}. {error_message}")
             # Extract specific error from result if available
             crawl_error = getattr(result, 'error', None) or getattr(result, 'error_message', 'Unknown crawl failure')
+            logger.error(f"Crawl4ai reported failure for {request.url} (status {getattr(result, 'status_code', None)}): "
+                         f"{excerpt(crawl_error, LOG_EXCERPT_CHARS)}")
             return ScrapeResponse(success=False, error=f"Crawl failed: {crawl_error}")
 
         # If crawl reported success, proceed to check extracted content
         logger.info(f"Crawl4ai reported success for {request.url}")
         extracted_data = getattr(result, 'extracted_content', None) # Define extracted_data HERE, before it's used
-        logger.info(f"Extracted data type: {type(extracted_data)}, Value (truncated): {str(extracted_data)[:500]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Extracted data type: {type(extracted_data)}, Value: {excerpt(extracted_data, LOG_EXCERPT_CHARS)}")
 
         # --- LLM Specific Handling: Check for None or incorrect type (list instead of expected object) ---
         llm_extraction_failed = False
@@ -275,44 +1017,32 @@ IMPORTANT: If the USER PROMPT asks for a list/array, ensure the JSON output is s
                 if "'str' object has no attribute 'choices'" in str(crawl4ai_error):
                     return ScrapeResponse(success=False, data=None, error=f"LLM extraction failed: {crawl4ai_error}")
 
-            # --- Optional Direct Gemini Debug Call (Triggered by failure) ---
+            # --- Direct Gemini Fallback (Triggered by failure) ---
+            # Runs on the reduced page text, chunked and in parallel for large pages
             try:
                 html_content = getattr(result, 'html', None)
                 if html_content:
-                    logger.info("Attempting direct Gemini call for debugging (LLM path)...")
-                    gemini_model = genai.GenerativeModel('gemini-1.5-flash') # Use consistent model
-                    # Use the original request prompt for the debug call
-                    full_prompt = request.prompt + "\n\nHTML CONTENT:\n" + html_content # Use request.prompt
-                    gemini_response = await gemini_model.generate_content_async(full_prompt)
-                    raw_gemini_text = getattr(gemini_response, 'text', None)
-
-                    if raw_gemini_text:
-                        logger.error(f"RAW GEMINI DEBUG RESPONSE for {request.url}: {raw_gemini_text}")
-                        # Attempt to clean and parse
-                        cleaned_text = raw_gemini_text.strip().removeprefix("```json").removesuffix("```").strip()
-                        logger.info(f"CLEANED GEMINI DEBUG TEXT for {request.url}: {cleaned_text}")
-                        try:
-                            parsed_data = json.loads(cleaned_text)
-                            logger.info(f"Successfully parsed cleaned Gemini debug response for {request.url}")
-                            # Return the successfully parsed data instead of the error
-                            return ScrapeResponse(success=True, data=parsed_data)
-                        except json.JSONDecodeError as parse_error:
-                            logger.error(f"Failed to parse cleaned Gemini debug response for {request.url}: {parse_error}")
-                            error_msg += f" Direct Gemini call failed to produce valid JSON: {parse_error}"
-                    else:
-                        logger.error(f"Direct Gemini debug call returned no text for {request.url}")
-                        error_msg += " Direct Gemini debug call returned no text."
+                    logger.info("Attempting direct Gemini extraction on reduced page content (LLM path)...")
+                    record_fallback("gemini_fallback")
+                    with timed("gemini_fallback"):
+                        parsed_data, reduction_stats = await gemini_extract(request.prompt, html_content, request.url) # Use request.prompt
+                    logger.info(f"Successfully parsed direct Gemini extraction for {request.url}")
+                    # Return the successfully parsed data instead of the error
+                    # partial: some chunks failed and the data is a merge of the others (not cached or learned from)
+                    return ScrapeResponse(success=True, data=parsed_data, metadata={
+                        "extraction_mode": "gemini_fallback", "tokens": reduction_stats, "partial": reduction_stats["failed_chunks"] > 0,
+                    })
                 else:
-                    logger.error(f"Could not retrieve HTML content for direct Gemini debug call for {request.url}.")
-                    error_msg += " Could not get HTML for direct Gemini debug call."
+                    logger.error(f"Could not retrieve HTML content for direct Gemini call for {request.url}.")
+                    error_msg += " Could not get HTML for direct Gemini call."
             except Exception as gemini_debug_e:
-                logger.error(f"Error during direct Gemini debug call for {request.url}: {gemini_debug_e}")
-                error_msg += f" Error during direct Gemini debug call: {gemini_debug_e}"
-            # --- End Optional Direct Gemini Debug Call ---
+                logger.error(f"Error during direct Gemini call for {request.url}: {gemini_debug_e}")
+                error_msg += f" Error during direct Gemini call: {gemini_debug_e}"
+            # --- End Direct Gemini Fallback ---
 
-            # If we reach here, it means the initial LLM extraction failed AND the debug call didn't successfully parse and return.
+            # If we reach here, it means the initial LLM extraction failed AND the direct call didn't successfully parse and return.
             # So, return the failure response.
-            logger.error(f"LLM extraction failed for {request.url}, and debug attempt did not yield valid JSON. Final error: {error_msg}")
+            logger.error(f"LLM extraction failed for {request.url}, and direct Gemini attempt did not yield valid JSON. Final error: {error_msg}")
             return ScrapeResponse(success=False, data=None, error=error_msg) # <<< ENSURE FAILURE RETURN HERE
 
         # --- General Data Processing (if not an LLM failure handled above) ---
@@ -326,11 +1056,12 @@ IMPORTANT: If the USER PROMPT asks for a list/array, ensure the JSON output is s
             if use_schema and isinstance(extracted_data, str):
                 try:
                     # JsonCssExtractionStrategy often returns a JSON string
-                    parsed_data = json.loads(extracted_data)
+                    with timed("json_parse"):
+                        parsed_data = json.loads(extracted_data)
                     logger.info(f"Successfully parsed CSS schema extracted_content string for {request.url}")
                 except json.JSONDecodeError as e:
                     logger.error(f"Failed to parse CSS schema extracted_content string for {request.url}: {e}")
-                    logger.error(f"Raw extracted_content string: {extracted_data}")
+                    logger.error(f"Raw extracted_content string: {excerpt(extracted_data, LOG_EXCERPT_CHARS)}")
                     parse_error = f"Failed to parse CSS schema JSON: {e}"
             # Check if we used LLM AND the result is a string that needs parsing (Gemini might add ```json)
             # This case should be less likely now due to the llm_extraction_failed check above, but keep for robustness
@@ -338,11 +1069,12 @@ IMPORTANT: If the USER PROMPT asks for a list/array, ensure the JSON output is s
                 try:
                     # Clean potential markdown formatting from LLM
                     cleaned_text = extracted_data.strip().removeprefix("```json").removesuffix("```").strip()
-                    parsed_data = json.loads(cleaned_text)
+                    with timed("json_parse"):
+                        parsed_data = json.loads(cleaned_text)
                     logger.info(f"Successfully parsed LLM extracted_content string for {request.url}")
                 except json.JSONDecodeError as e:
                     logger.error(f"Failed to parse LLM extracted_content string for {request.url}: {e}")
-                    logger.error(f"Raw extracted_content string: {extracted_data}")
+                    logger.error(f"Raw extracted_content string: {excerpt(extracted_data, LOG_EXCERPT_CHARS)}")
                     parse_error = f"Failed to parse LLM JSON: {e}"
             elif isinstance(extracted_data, (dict, list)):
                 # Already in the correct format (e.g., CSS schema returning list/dict, or LLM behaving)
@@ -350,12 +1082,12 @@ IMPORTANT: If the USER PROMPT asks for a list/array, ensure the JSON output is s
             else:
                 # Unexpected type
                 parse_error = f"Extraction returned unexpected data type: {type(extracted_data)}"
-                logger.error(f"{parse_error}. Value: {str(extracted_data)[:500]}")
+                logger.error(f"{parse_error}. Value: {excerpt(extracted_data, LOG_EXCERPT_CHARS)}")
 
             if parsed_data is not None:
                 # Further check if the parsed data is a dict or list
                 if not isinstance(parsed_data, (dict, list)):
-                    logger.error(f"Parsed data is not a dictionary or list (type: {type(parsed_data)}). Value: {str(parsed_data)[:500]}")
+                    logger.error(f"Parsed data is not a dictionary or list (type: {type(parsed_data)}). Value: {excerpt(parsed_data, LOG_EXCERPT_CHARS)}")
                     # Return success=False because the final data is unusable
                     return ScrapeResponse(success=False, data=None, error=f"Parsed data is unexpected type: {type(parsed_data)}")
                 else:
@@ -373,6 +1105,9 @@ IMPORTANT: If the USER PROMPT asks for a list/array, ensure the JSON output is s
                         return ScrapeResponse(success=False, data=None, error=f"LLM extraction failed: {llm_error_content}")
                     else:
                         logger.info(f"Successfully extracted and parsed data for {request.url}")
+                        if not use_schema:
+                            # Chunked pages come back as the concatenated per-chunk results: drop the records repeated in chunk overlaps
+                            parsed_data = dedupe_chunked_result(parsed_data)
                         return ScrapeResponse(success=True, data=parsed_data)
             else:
                 # Parsing failed or original type was wrong
@@ -388,6 +1123,271 @@ IMPORTANT: If the USER PROMPT asks for a list/array, ensure the JSON output is s
         logger.exception(f"An unexpected error occurred processing result for {request.url}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error during result processing: {str(e)}")
 
+async def gemini_extract(prompt: str, html: str, url: str) -> tuple[dict | list | None, dict]:
+    """
+    Direct Gemini extraction over a page reduced to compact text (no scripts, styles, SVG,
+    tracking markup). Oversized pages are split into chunks that are extracted concurrently
+    and merged (items deduplicated). Returns the parsed data and token statistics.
+    Raises ValueError if no chunk produced valid JSON.
+    """
+    with timed("content_reduction"):
+        compact_text = await cpu_pool.run(html_to_compact_text, html)
+    chunks = chunk_text(compact_text, LLM_CHUNK_TOKENS, LLM_CHUNK_OVERLAP_TOKENS)
+    stats = {
+        "before_reduction": estimate_tokens(html),
+        "after_reduction": estimate_tokens(compact_text),
+        "chunks": len(chunks),
+    }
+    logger.info(f"Reduced {url} from ~{stats['before_reduction']} to ~{stats['after_reduction']} tokens ({len(chunks)} chunk(s))")
+
+    semaphore = asyncio.Semaphore(LLM_CHUNK_CONCURRENCY)
+
+    async def extract_chunk(index: int, chunk: str):
+        chunk_note = f"\n(This is part {index + 1} of {len(chunks)} of the page.)" if len(chunks) > 1 else ""
+        async with semaphore:
+            gemini_response = await gemini_client.generate_content('gemini-1.5-flash', prompt + chunk_note + "\n\nPAGE CONTENT:\n" + chunk)
+        raw_gemini_text = getattr(gemini_response, 'text', None)
+        if not raw_gemini_text:
+            raise ValueError(f"Gemini returned no text for chunk {index + 1}")
+        # Clean potential markdown formatting from the LLM
+        cleaned_text = raw_gemini_text.strip().removeprefix("```json").removesuffix("```").strip()
+        try:
+            return json.loads(cleaned_text)
+        except json.JSONDecodeError as parse_error:
+            logger.error(f"Failed to parse Gemini response for chunk {index + 1} of {url}: {parse_error}. Raw: {excerpt(cleaned_text, LOG_EXCERPT_CHARS)}")
+            raise ValueError(f"Gemini response for chunk {index + 1} was not valid JSON: {parse_error}")
+
+    with timed("gemini_call"):
+        chunk_results = await asyncio.gather(*(extract_chunk(i, chunk) for i, chunk in enumerate(chunks)), return_exceptions=True)
+    parsed_chunks = [chunk_result for chunk_result in chunk_results if not isinstance(chunk_result, BaseException)]
+    failures = [chunk_result for chunk_result in chunk_results if isinstance(chunk_result, BaseException)]
+    stats["failed_chunks"] = len(failures)
+    if not parsed_chunks:
+        raise ValueError(str(failures[0]) if failures else "No content to extract")
+    if failures:
+        logger.warning(f"{len(failures)}/{len(chunks)} Gemini chunk extractions failed for {url}; returning partial merge")
+    data = parsed_chunks[0] if len(parsed_chunks) == 1 else merge_extractions(parsed_chunks)
+    return data, stats
+
+
+@app.post("/crawl/listing", response_model=None)
+async def crawl_listing(request: ListingCrawlRequest):
+    """
+    Crawls a listing page (following pagination up to max_pages), resolves each item's detail link
+    against its listing page and scrapes the detail pages concurrently, all inside the service.
+    Detail URLs in known_urls are skipped. With stream=true, records are sent as NDJSON lines as
+    they complete, followed by a {"type": "summary"} line.
+    """
+    logger.info(f"Received listing crawl request for {request.url} (max_pages {request.max_pages})")
+    if not request.listing_prompt and not request.listing_schema:
+        raise HTTPException(status_code=400, detail="Either listing_prompt or listing_schema must be provided")
+    if request.page_url_template and "{page}" not in request.page_url_template:
+        raise HTTPException(status_code=400, detail="page_url_template must contain a {page} placeholder")
+    if request.page_url_template and request.next_page_selector:
+        raise HTTPException(status_code=400, detail="Provide either page_url_template or next_page_selector, not both")
+
+    if request.stream:
+        async def ndjson_events():
+            async for event in iterate_listing_crawl(request):
+                yield json.dumps(event, default=str) + "\n"
+        return StreamingResponse(ndjson_events(), media_type="application/x-ndjson")
+
+    records, summary = [], {}
+    async for event in iterate_listing_crawl(request):
+        if event["type"] == "record":
+            records.append(ListingRecord(**event["record"]))
+        else:
+            summary = event
+    return ListingCrawlResponse(
+        success=not summary["errors"] and all(record.success for record in records),
+        pages_crawled=summary["pages_crawled"],
+        skipped_known=summary["skipped_known"],
+        records=records,
+        errors=summary["errors"],
+    )
+
+
+async def iterate_listing_crawl(request: ListingCrawlRequest):
+    """
+    Async generator behind /crawl/listing: yields {"type": "record", "record": {...}} events as
+    detail pages complete and a final {"type": "summary", ...} event.
+    """
+    known = {normalize_url(url) for url in request.known_urls}
+    seen_details: set[str] = set()
+    detail_slots = FairSlots(domain_scheduler, min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    events: asyncio.Queue = asyncio.Queue()
+    detail_tasks: list[asyncio.Task] = []
+    errors: list[str] = []
+    counters = {"pages_crawled": 0, "skipped_known": 0}
+    has_detail_step = bool(request.detail_prompt or request.detail_schema)
+
+    def scrape_request(url: str, prompt: str | None, schema: dict | None, if_changed: bool = False) -> ScrapeRequest:
+        return ScrapeRequest(
+            url=url, prompt=prompt, schema=schema, headers=request.headers, bypass_cache=request.bypass_cache,
+            auto_schema=request.auto_schema, fetch_mode=request.fetch_mode, load_profile=request.load_profile,
+            if_changed=if_changed,
+        )
+
+    async def scrape_listing_page(page_url: str) -> ScrapeResponse | None:
+        try:
+            response = await run_scrape(scrape_request(page_url, request.listing_prompt, request.listing_schema))
+        except HTTPException as e:
+            response = ScrapeResponse(success=False, error=str(e.detail))
+        counters["pages_crawled"] += 1
+        if not response.success:
+            errors.append(f"Listing page {page_url} failed: {response.error}")
+            return None
+        return response
+
+    async def scrape_detail(detail_url: str, listing_item: dict):
+        async with detail_slots.slot(detail_url):
+            try:
+                response = await run_scrape(scrape_request(detail_url, request.detail_prompt, request.detail_schema, request.if_changed))
+                record = {"url": detail_url, "listing": listing_item, "detail": response.data, "unchanged": response.unchanged,
+                          "success": response.success, "error": response.error}
+            except HTTPException as e:
+                record = {"url": detail_url, "listing": listing_item, "success": False, "error": str(e.detail)}
+            except Exception as e:
+                logger.exception(f"Unexpected error scraping detail page {detail_url}")
+                record = {"url": detail_url, "listing": listing_item, "success": False, "error": f"Internal Server Error: {str(e)}"}
+        await events.put({"type": "record", "record": record})
+
+    def queue_details(page_url: str, response: ScrapeResponse):
+        for item in records_of(response.data, "items"):
+            link = item.get(request.link_field)
+            if not link:
+                events.put_nowait({"type": "record", "record": {
+                    "listing": item, "success": False, "error": f"Listing item has no '{request.link_field}' link"}})
+                continue
+            detail_url = urljoin(page_url, str(link))
+            key = normalize_url(detail_url)
+            if key in known:
+                counters["skipped_known"] += 1
+                continue
+            if key in seen_details or (request.max_details is not None and len(seen_details) >= request.max_details):
+                continue
+            seen_details.add(key)
+            if has_detail_step:
+                detail_tasks.append(asyncio.create_task(scrape_detail(detail_url, item)))
+            else:
+                events.put_nowait({"type": "record", "record": {"url": detail_url, "listing": item}})
+
+    async def crawl_pages():
+        try:
+            if request.page_url_template:
+                # Page URLs are known up front: fetch all listing pages concurrently
+                page_urls = [request.url] + [
+                    # Plain substitution: templates may contain other braces (e.g. JSON in a query string)
+                    urljoin(request.url, request.page_url_template.replace("{page}", str(n)))
+                    for n in range(2, request.max_pages + 1)
+                ]
+                responses = await asyncio.gather(*(scrape_listing_page(page_url) for page_url in page_urls))
+                for page_url, response in zip(page_urls, responses):
+                    if response:
+                        queue_details(page_url, response)
+            else:
+                # Follow 'next page' links; detail pages of page N are crawled while page N+1 loads
+                page_url, visited = request.url, set()
+                while page_url and counters["pages_crawled"] < request.max_pages and normalize_url(page_url) not in visited:
+                    visited.add(normalize_url(page_url))
+                    response = await scrape_listing_page(page_url)
+                    if not response:
+                        break
+                    queue_details(page_url, response)
+                    html = response._page.html if response._page else None
+                    page_url = await cpu_pool.run(next_page_link, html, page_url, request.next_page_selector) if request.next_page_selector and html else None
+            await asyncio.gather(*detail_tasks)
+        finally:
+            await events.put(None) # End of records
+
+    producer = asyncio.create_task(crawl_pages())
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+        await producer # Re-raise unexpected producer errors
+    finally:
+        # Client went away (streaming) or an error occurred: stop outstanding work
+        if not producer.done():
+            producer.cancel()
+        for task in detail_tasks:
+            if not task.done():
+                task.cancel()
+
+    logger.info(f"Listing crawl of {request.url} finished: {counters['pages_crawled']} page(s), "
+                f"{len(seen_details)} detail page(s), {counters['skipped_known']} known skipped")
+    yield {"type": "summary", **counters, "details_crawled": len(seen_details) if has_detail_step else 0, "errors": errors}
+
+
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(request: JobRequest):
+    """
+    Queues a scrape to run in the background and returns its job id immediately.
+    Poll GET /jobs/{job_id} or pass webhook_url to be notified on completion.
+    Returns 429 with Retry-After when the queue is full.
+    """
+    if not job_queue or not job_workers:
+        raise HTTPException(status_code=503, detail="Job queue not initialized")
+    if not request.prompt and not request.schema:
+        raise HTTPException(status_code=400, detail="Either prompt or schema must be provided")
+
+    payload = request.dict(exclude={"webhook_url"})
+    try:
+        job_id, depth = await asyncio.to_thread(job_queue.enqueue, payload, request.webhook_url, JOB_QUEUE_MAX_DEPTH)
+    except QueueFull as e:
+        retry_after = await asyncio.to_thread(job_workers.retry_after)
+        logger.warning(f"Rejecting job for {request.url}: queue depth {e.depth} >= {JOB_QUEUE_MAX_DEPTH}")
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later", headers={"Retry-After": str(retry_after)})
+    job_workers.notify()
+    logger.info(f"Queued job {job_id} for {request.url} (queue depth {depth})")
+    return JobSubmitResponse(job_id=job_id, status="queued", queue_depth=depth)
+
+
+@app.get("/jobs/stats")
+async def job_stats():
+    """
+    Queue depth, job counts by status and recent average wait/run times.
+    """
+    if not job_queue:
+        raise HTTPException(status_code=503, detail="Job queue not initialized")
+    return {**(await asyncio.to_thread(job_queue.stats)), "workers": JOB_WORKERS, "max_depth": JOB_QUEUE_MAX_DEPTH}
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """
+    Returns the status of a queued job, and its result once finished.
+    """
+    if not job_queue:
+        raise HTTPException(status_code=503, detail="Job queue not initialized")
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return JobStatusResponse(
+        job_id=job["id"],
+        status=job["status"],
+        result=job["result"],
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        attempts=job["attempts"],
+    )
+
+
+async def run_job(payload: dict) -> dict:
+    """Job handler for the worker pool: runs the stored scrape request."""
+    response = await run_scrape(ScrapeRequest(**payload))
+    return response.dict()
+
+
+@app.get("/domains")
+async def domain_stats():
+    """
+    Per-domain politeness state: current adaptive rate, waiting requests, throttle events and pauses.
+    """
+    return await domain_scheduler.stats()
+
+
 @app.get("/test-gemini", response_model=GeminiTestResponse)
 async def test_gemini_connection():
     """
@@ -401,9 +1401,8 @@ async def test_gemini_connection():
     try:
         # Initialize the Gemini model
         # Use the same model as the scrape endpoint for consistency
-        model = genai.GenerativeModel('gemini-1.5-flash')
         logger.info("Attempting to generate content with Gemini model 'gemini-1.5-flash'...")
-        response = await model.generate_content_async("What is 2+2?") # Use async version
+        response = await gemini_client.generate_content('gemini-1.5-flash', "What is 2+2?")
 
         # Log and return the response text
         response_text = response.text
@@ -415,12 +1414,61 @@ async def test_gemini_connection():
         return GeminiTestResponse(success=False, error=f"Gemini API Error: {str(e)}")
 
 
+async def store_stats(store) -> dict | None:
+    """A SQLite store's stats, queried off the event loop (the query waits for the store's lock)."""
+    return await asyncio.to_thread(store.stats) if store else None
+
+
 @app.get("/health")
 async def health_check():
     """
     Simple health check endpoint.
     """
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "crawler_pool": crawler_pool.stats() if crawler_pool else None,
+        "extraction_cache": await store_stats(extraction_cache),
+        "inflight_scrapes": inflight_scrapes.stats(),
+        "auto_schemas": await store_stats(schema_registry),
+        "fetch_modes": fetch_modes.stats(),
+        "jobs": await store_stats(job_queue),
+        "page_fingerprints": await store_stats(fingerprint_store),
+        "failure_artifacts": failure_artifacts.stats(),
+        "cpu_pool": cpu_pool.stats(),
+    }
+
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once the default browser is started and warm, 503 while it is still
+    warming up or being relaunched after a crash. /health stays the liveness probe.
+    """
+    if not crawler_pool or not crawler_pool.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage and per-domain latency histograms, outcome and fallback counters,
+    in-flight gauges, job queue depth and browser/service memory.
+    """
+    JOB_QUEUE_DEPTH.set(await asyncio.to_thread(job_queue.depth) if job_queue else 0)
+    CRAWLER_POOL_SIZE.set(crawler_pool.stats()["size"] if crawler_pool else 0)
+    body, content_type = await asyncio.to_thread(render_metrics)
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss/eviction counters for the extraction result cache.
+    """
+    if not extraction_cache:
+        return {"enabled": False}
+    return {"enabled": True, **await store_stats(extraction_cache)}
 
 # --- Main Execution (for running with uvicorn) ---
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import psutil
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+logger = logging.getLogger(__name__)
+
+# Per-domain labels are capped so a crawl over many sites can't blow up metric cardinality
+MAX_DOMAIN_LABELS = int(os.getenv("METRICS_MAX_DOMAIN_LABELS", "200"))
+
+# Set (by serve.py) when several worker processes serve the API: each process writes its metrics to files in this
+# directory and /metrics aggregates all of them, whichever worker answers. Gauges say how processes combine.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+STAGE_SECONDS = Histogram("scrape_stage_seconds", "Time spent in each scrape stage", ["stage"], buckets=LATENCY_BUCKETS)
+SCRAPE_SECONDS = Histogram("scrape_duration_seconds", "End-to-end scrape time (excluding queueing)",
+                           ["domain", "extraction_mode"], buckets=LATENCY_BUCKETS)
+SCRAPES_TOTAL = Counter("scrapes_total", "Scrapes by outcome (success, failure, cached, unchanged)", ["domain", "outcome"])
+FALLBACKS_TOTAL = Counter("scrape_fallbacks_total", "Fallbacks taken (browser escalation, Gemini fallback, learned schema to LLM)", ["kind"])
+SCRAPES_IN_PROGRESS = Gauge("scrapes_in_progress", "Scrapes waiting for a slot or running", ["state"], multiprocess_mode="livesum")
+JOB_QUEUE_DEPTH = Gauge("job_queue_depth", "Jobs waiting in the queue", multiprocess_mode="livemax") # The queue is shared
+CRAWLER_POOL_SIZE = Gauge("crawler_pool_size", "Started crawlers in the pool", multiprocess_mode="livesum")
+BROWSER_MEMORY_BYTES = Gauge("browser_memory_bytes", "Resident memory of the browser processes started by this service",
+                             multiprocess_mode="livesum")
+PROCESS_MEMORY_BYTES = Gauge("service_memory_bytes", "Resident memory of the service processes", multiprocess_mode="livesum")
+
+_domain_labels: set[str] = set()
+
+# The StageTimer of the request being served; asyncio tasks inherit it, so stages timed deep in the
+# scrape (fetch, extraction, Gemini) are attributed to the request that started it
+current_timer: ContextVar["StageTimer | None"] = ContextVar("current_timer", default=None)
+
+
+class StageTimer:
+    """Accumulates stage durations for one request (repeated stages are summed)."""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_dict(self) -> dict:
+        """Stage durations in milliseconds."""
+        return {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """The stages as a Server-Timing header value."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items())
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timer = current_timer.get()
+    if timer is not None:
+        timer.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """Times the enclosed block as `stage` (also usable around awaits)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def domain_label(domain: str) -> str:
+    if domain in _domain_labels:
+        return domain
+    if len(_domain_labels) < MAX_DOMAIN_LABELS:
+        _domain_labels.add(domain)
+        return domain
+    return "other"
+
+
+def record_scrape(domain: str, outcome: str, extraction_mode: str | None, seconds: float):
+    label = domain_label(domain)
+    SCRAPES_TOTAL.labels(label, outcome).inc()
+    SCRAPE_SECONDS.labels(label, extraction_mode or "none").observe(seconds)
+
+
+def record_fallback(kind: str):
+    FALLBACKS_TOTAL.labels(kind).inc()
+
+
+def browser_memory_bytes() -> int:
+    """Summed RSS of the Chromium processes below this process (Playwright launches them as children)."""
+    total = 0
+    for child in psutil.Process().children(recursive=True):
+        try:
+            if "chrom" in child.name().lower() or "headless_shell" in child.name().lower():
+                total += child.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total
+
+
+def refresh_memory_gauges():
+    """Sets the process/browser memory gauges for this process."""
+    try:
+        BROWSER_MEMORY_BYTES.set(browser_memory_bytes())
+        PROCESS_MEMORY_BYTES.set(psutil.Process().memory_info().rss)
+    except Exception as e:
+        logger.warning(f"Could not read process memory for metrics: {e}")
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Refreshes the memory gauges and renders all metrics (of every worker process) in Prometheus text format."""
+    refresh_memory_gauges()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Drops this process's live gauges from the shared metrics when it exits."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+from extraction_cache import hash_text, normalize_url
+
+logger = logging.getLogger(__name__)
+
+
+class FingerprintStore:
+    """
+    SQLite store of what each (URL, extraction instruction) looked like when it was last scraped
+    successfully: the ETag / Last-Modified validators and a fingerprint of the pruned main content.
+    Used to send conditional requests and to skip extraction when nothing relevant changed.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS page_fingerprints (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fingerprint TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url: str, instruction_hash: str) -> str:
+        return hash_text(f"{normalize_url(url)}|{instruction_hash}")
+
+    def _get(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM page_fingerprints WHERE key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def _put(self, key: str, url: str, etag: str | None, last_modified: str | None, fingerprint: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_fingerprints (key, url, etag, last_modified, fingerprint, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_url(url), etag, last_modified, fingerprint, time.time()),
+            )
+            self._conn.commit()
+
+    async def get(self, url: str, instruction_hash: str) -> dict | None:
+        try:
+            return await asyncio.to_thread(self._get, self.make_key(url, instruction_hash))
+        except Exception as e:
+            logger.error(f"Fingerprint store read failed: {e}")
+            return None
+
+    async def put(self, url: str, instruction_hash: str, etag: str | None, last_modified: str | None, fingerprint: str):
+        try:
+            await asyncio.to_thread(self._put, self.make_key(url, instruction_hash), url, etag, last_modified, fingerprint)
+        except Exception as e:
+            logger.error(f"Fingerprint store write failed: {e}")
+
+    @staticmethod
+    def conditional_headers(previous: dict | None) -> dict:
+        """If-None-Match / If-Modified-Since headers for a conditional re-fetch."""
+        headers = {}
+        if previous and previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous and previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+        return headers
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM page_fingerprints").fetchone()[0]
+        return {"pages": size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,379 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Callable, TypeVar
+
+import psutil
+
+from http_fetcher import domain_of, is_bot_challenge
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUS_CODES = {429, 503}
+# Seconds between attempts to take a domain concurrency slot held by other worker processes
+SLOT_POLL_INTERVAL = 0.2
+
+T = TypeVar("T")
+
+
+@dataclass
+class DomainLimits:
+    rate: float = 1.0 # Requests per second
+    burst: int = 3 # Token bucket capacity
+    concurrency: int = 2 # Scrapes in flight at once
+
+
+@dataclass
+class TokenBucket:
+    """Adaptive token bucket of one domain. Times are wall-clock so the bucket can be shared between processes."""
+    tokens: float
+    current_rate: float # Adaptive rate, <= limits.rate
+    last_refill: float = field(default_factory=time.time)
+    blocked_until: float = 0.0
+    backoff: float = 0.0
+
+    def take(self, limits: DomainLimits, now: float) -> float:
+        """Takes a token and returns 0, or returns the seconds to wait before trying again."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.current_rate = min(self.current_rate, limits.rate) # The configured rate may have been lowered since
+        self.tokens = min(limits.burst, self.tokens + (now - self.last_refill) * self.current_rate)
+        self.last_refill = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.current_rate
+
+    def throttle(self, limits: DomainLimits, now: float, max_backoff: float, retry_after: str | None) -> float:
+        """Halves the rate and pauses the domain with exponential backoff (or for Retry-After); returns the pause."""
+        self.current_rate = max(limits.rate / 16, self.current_rate / 2)
+        self.backoff = min(max_backoff, max(2.0, self.backoff * 2))
+        pause = self.backoff
+        if retry_after and retry_after.isdigit():
+            pause = min(max_backoff, max(pause, float(retry_after)))
+        self.blocked_until = now + pause
+        self.tokens = 0
+        return pause
+
+    def recover(self, limits: DomainLimits):
+        self.backoff = 0.0
+        self.current_rate = min(limits.rate, self.current_rate + limits.rate * 0.1)
+
+
+@dataclass
+class DomainState:
+    limits: DomainLimits
+    semaphore: asyncio.Semaphore
+    bucket: TokenBucket # Used when the scheduler has no shared store
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    requests: int = 0
+    throttled: int = 0
+    waiting: int = 0
+
+
+class DomainStateStore:
+    """
+    SQLite (WAL) store of every domain's token bucket and concurrency slots, so the worker processes of
+    one host apply a single rate limit, backoff and concurrency cap per domain instead of one each.
+    Slots are leases held by a process id. `renew_leases` keeps this process's leases fresh while they
+    are held (however long the holder waits for a rate token); leases of processes that are gone, or not
+    renewed for `lease_ttl` seconds, are released when the domain is next asked for a slot.
+    """
+
+    def __init__(self, path: str, lease_ttl: float = 300.0):
+        self.lease_ttl = lease_ttl
+        self._lock = threading.Lock()
+        self._held: set[str] = set() # Leases taken by this process and not yet released
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS domain_buckets (
+                domain TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                current_rate REAL NOT NULL,
+                last_refill REAL NOT NULL,
+                blocked_until REAL NOT NULL,
+                backoff REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS domain_slots (
+                id TEXT PRIMARY KEY,
+                domain TEXT NOT NULL,
+                holder INTEGER NOT NULL,
+                acquired_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_domain_slots_domain ON domain_slots (domain)")
+        self._conn.commit()
+
+    def _update(self, domain: str, limits: DomainLimits, change: Callable[[TokenBucket], T]) -> T:
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so concurrent read-modify-writes from other processes serialize
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, current_rate, last_refill, blocked_until, backoff FROM domain_buckets WHERE domain = ?",
+                    (domain,),
+                ).fetchone()
+                bucket = TokenBucket(*row) if row else TokenBucket(tokens=float(limits.burst), current_rate=limits.rate)
+                result = change(bucket)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO domain_buckets (domain, tokens, current_rate, last_refill, blocked_until, backoff) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (domain, bucket.tokens, bucket.current_rate, bucket.last_refill, bucket.blocked_until, bucket.backoff),
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return result
+
+    def _acquire_slot(self, domain: str, concurrency: int) -> str | None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                live, stale = 0, []
+                for lease, holder, acquired_at in self._conn.execute(
+                    "SELECT id, holder, acquired_at FROM domain_slots WHERE domain = ?", (domain,)
+                ).fetchall():
+                    if now - acquired_at > self.lease_ttl or not psutil.pid_exists(holder):
+                        stale.append((lease,))
+                    else:
+                        live += 1
+                if stale:
+                    self._conn.executemany("DELETE FROM domain_slots WHERE id = ?", stale)
+                lease = None
+                if live < concurrency:
+                    lease = uuid.uuid4().hex
+                    self._conn.execute(
+                        "INSERT INTO domain_slots (id, domain, holder, acquired_at) VALUES (?, ?, ?, ?)",
+                        (lease, domain, os.getpid(), now),
+                    )
+                self._conn.commit()
+                if lease:
+                    self._held.add(lease)
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return lease
+
+    def _release_slot(self, lease: str):
+        with self._lock:
+            self._held.discard(lease)
+            self._conn.execute("DELETE FROM domain_slots WHERE id = ?", (lease,))
+            self._conn.commit()
+
+    def _renew_leases(self):
+        with self._lock:
+            if self._held:
+                now = time.time()
+                self._conn.executemany("UPDATE domain_slots SET acquired_at = ? WHERE id = ?", [(now, lease) for lease in self._held])
+                self._conn.commit()
+
+    async def update(self, domain: str, limits: DomainLimits, change: Callable[[TokenBucket], T]) -> T:
+        """Applies `change` to the domain's stored bucket in one transaction and returns its result."""
+        return await asyncio.to_thread(self._update, domain, limits, change)
+
+    async def acquire_slot(self, domain: str, concurrency: int) -> str | None:
+        """Takes one of the domain's `concurrency` slots; returns the lease, or None if all are held."""
+        return await asyncio.to_thread(self._acquire_slot, domain, concurrency)
+
+    async def release_slot(self, lease: str):
+        await asyncio.to_thread(self._release_slot, lease)
+
+    async def renew_leases(self):
+        """Renews this process's held slots every quarter of `lease_ttl`, like job heartbeats (runs until cancelled)."""
+        while True:
+            await asyncio.sleep(self.lease_ttl / 4)
+            try:
+                await asyncio.to_thread(self._renew_leases)
+            except sqlite3.Error as e:
+                logger.warning(f"Renewing domain slot leases failed: {e}")
+
+    def _blocked_until(self, domain: str) -> float:
+        with self._lock:
+            row = self._conn.execute("SELECT blocked_until FROM domain_buckets WHERE domain = ?", (domain,)).fetchone()
+        return row[0] if row else 0.0
+
+    async def blocked_until(self, domain: str) -> float:
+        """End of the domain's backoff pause (0 if it was never paused)."""
+        return await asyncio.to_thread(self._blocked_until, domain)
+
+    def buckets(self) -> dict[str, TokenBucket]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT domain, tokens, current_rate, last_refill, blocked_until, backoff FROM domain_buckets"
+            ).fetchall()
+        return {row[0]: TokenBucket(*row[1:]) for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DomainScheduler:
+    """
+    Per-domain politeness: a token bucket (rate/burst) and a concurrency cap per domain, with
+    adaptive backoff. Throttling responses (429/503 or CAPTCHA pages) halve the domain's rate and
+    pause it with exponential backoff (or for Retry-After); successes slowly restore the rate.
+    Requests wait for their own domain only, so a slow or throttled site doesn't hold up others.
+    With a `store`, buckets and concurrency slots are shared with the other worker processes.
+    """
+
+    def __init__(self, default_limits: DomainLimits, overrides: dict[str, DomainLimits] | None = None,
+                 max_backoff: float = 300.0, store: DomainStateStore | None = None):
+        self.default_limits = default_limits
+        self.overrides = overrides or {}
+        self.max_backoff = max_backoff
+        self.store = store
+        self._domains: dict[str, DomainState] = {}
+
+    def limits_for(self, domain: str) -> DomainLimits:
+        # Overrides match the domain itself or any parent domain ("example.com" covers "www.example.com")
+        for configured, limits in self.overrides.items():
+            if domain == configured or domain.endswith("." + configured):
+                return limits
+        return self.default_limits
+
+    def _state(self, domain: str) -> DomainState:
+        state = self._domains.get(domain)
+        if state is None:
+            limits = self.limits_for(domain)
+            state = DomainState(
+                limits=limits,
+                semaphore=asyncio.Semaphore(limits.concurrency),
+                bucket=TokenBucket(tokens=float(limits.burst), current_rate=limits.rate),
+            )
+            self._domains[domain] = state
+        return state
+
+    async def _update_bucket(self, domain: str, state: DomainState, change: Callable[[TokenBucket], T]) -> T:
+        if self.store:
+            return await self.store.update(domain, state.limits, change)
+        return change(state.bucket)
+
+    async def acquire_token(self, domain: str):
+        """Waits until the domain's bucket has a token (and any backoff has passed), then takes it."""
+        state = self._state(domain)
+        async with state.lock: # Serializes waiters per domain so tokens are handed out in order
+            while True:
+                wait = await self._update_bucket(domain, state, lambda bucket: bucket.take(state.limits, time.time()))
+                if wait <= 0:
+                    state.requests += 1
+                    return
+                await asyncio.sleep(wait)
+
+    async def wait_until_open(self, domain: str):
+        """
+        Waits out a backoff pause on the domain without taking a token or slot, so callers can hold
+        back before taking shared capacity (batch or global slots) that other domains could use.
+        """
+        state = self._state(domain)
+        while True:
+            blocked_until = await self.store.blocked_until(domain) if self.store else state.bucket.blocked_until
+            wait = blocked_until - time.time()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def _acquire_shared_slot(self, domain: str, limits: DomainLimits) -> str:
+        while True:
+            lease = await self.store.acquire_slot(domain, limits.concurrency)
+            if lease:
+                return lease
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Holds one of the domain's concurrency slots and one rate token for the duration of a scrape."""
+        domain = domain_of(url)
+        state = self._state(domain)
+        lease = None
+        state.waiting += 1
+        try:
+            await state.semaphore.acquire()
+            if self.store:
+                try:
+                    lease = await self._acquire_shared_slot(domain, state.limits)
+                except BaseException:
+                    state.semaphore.release()
+                    raise
+        finally:
+            state.waiting -= 1
+        try:
+            await self.acquire_token(domain)
+            yield
+        finally:
+            if lease:
+                await self.store.release_slot(lease)
+            state.semaphore.release()
+
+    async def report(self, url: str, status_code: int | None, html: str | None = None, retry_after: str | None = None) -> bool:
+        """Feeds a fetch outcome back into the domain's adaptive rate. Returns True if the site throttled the fetch."""
+        domain = domain_of(url)
+        state = self._state(domain)
+        throttled = (status_code in THROTTLE_STATUS_CODES) or bool(html and len(html) < 50_000 and is_bot_challenge(html))
+        if throttled:
+            state.throttled += 1
+            pause, rate = await self._update_bucket(domain, state, lambda bucket: (
+                bucket.throttle(state.limits, time.time(), self.max_backoff, retry_after), bucket.current_rate
+            ))
+            logger.warning(f"Throttling detected for {domain} (status {status_code}); "
+                           f"pausing {pause:.0f}s, rate now {rate:.2f}/s")
+        else:
+            await self._update_bucket(domain, state, lambda bucket: bucket.recover(state.limits))
+        return throttled
+
+    async def stats(self) -> dict:
+        # Shared buckets cover the domains scraped by every worker; the request counters are this worker's.
+        # The store is read off the event loop: the query can wait behind another process's slot update.
+        if self.store:
+            buckets = await asyncio.to_thread(self.store.buckets)
+        else:
+            buckets = {domain: state.bucket for domain, state in self._domains.items()}
+        now = time.time()
+        stats = {}
+        for domain, bucket in buckets.items():
+            state = self._domains.get(domain)
+            limits = state.limits if state else self.limits_for(domain)
+            stats[domain] = {
+                "rate": round(bucket.current_rate, 3),
+                "configured_rate": limits.rate,
+                "concurrency": limits.concurrency,
+                "waiting": state.waiting if state else 0,
+                "requests": state.requests if state else 0,
+                "throttled": state.throttled if state else 0,
+                "paused_for_seconds": round(max(0.0, bucket.blocked_until - now), 1),
+            }
+        return stats
+
+
+class FairSlots:
+    """
+    Concurrency limit for a batch of URLs that a paused domain can't starve: a URL waits out its
+    domain's backoff before taking one of the batch slots, so the other domains of a mixed batch keep
+    going. Per-domain concurrency only applies to the network fetches (DomainScheduler.slot), so a
+    batch against one site still runs extraction at the batch's concurrency.
+    """
+
+    def __init__(self, scheduler: DomainScheduler, concurrency: int):
+        self.scheduler = scheduler
+        self._slots = asyncio.Semaphore(concurrency)
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        await self.scheduler.wait_until_open(domain_of(url))
+        async with self._slots:
+            yield
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import gemini_client
+from content_reduction import strip_html_noise
+from cpu_pool import CpuPool, run_css_schema
+from extraction_cache import hash_text
+
+logger = logging.getLogger(__name__)
+
+# Max characters of HTML sent to the LLM when asking it to write a schema
+SCHEMA_GENERATION_HTML_LIMIT = 120_000
+
+SCHEMA_GENERATION_PROMPT = """
+You write CSS extraction schemas for the crawl4ai JsonCssExtractionStrategy.
+Given the HTML below and example records that were extracted from it, return ONLY a JSON object of the form:
+{{"name": "<short name>", "baseSelector": "<CSS selector matching each record>", "fields": [
+  {{"name": "<field>", "selector": "<CSS selector relative to baseSelector>", "type": "text"}},
+  {{"name": "<field>", "selector": "<CSS selector relative to baseSelector>", "type": "attribute", "attribute": "<attr>"}}
+]}}
+Rules: use exactly the field names of the example records; prefer stable class/id/structural selectors over
+generated or positional ones; use type "attribute" for links (href) and images (src).
+{shape_rule}
+
+EXAMPLE RECORDS:
+{examples}
+
+HTML:
+{html}
+"""
+
+
+def page_template(url: str) -> str:
+    """
+    Template signature of a URL: host plus its path with id-like segments (anything
+    containing a digit) replaced by ':id', so all detail pages of a site share a template.
+    """
+    parts = urlsplit(url)
+    segments = [":id" if re.search(r"\d", segment) else segment for segment in parts.path.split("/") if segment]
+    return f"{(parts.hostname or '').lower()}/{'/'.join(segments)}"
+
+
+def records_of(data, shape: str) -> list[dict]:
+    """The list of records in an extraction result, for either response shape."""
+    if shape == "items":
+        items = data.get("items") if isinstance(data, dict) else data
+        return [item for item in items or [] if isinstance(item, dict)]
+    if isinstance(data, list):
+        return [item for item in data[:1] if isinstance(item, dict)]
+    return [data] if isinstance(data, dict) else []
+
+
+def shape_of(data) -> str | None:
+    """'items' for {"items": [...]} / list results, 'object' for a single record, None if unusable."""
+    if isinstance(data, dict) and isinstance(data.get("items"), list):
+        return "items" if data["items"] else None
+    if isinstance(data, list):
+        return "items" if data else None
+    if isinstance(data, dict) and data:
+        return "object"
+    return None
+
+
+def _is_empty(value) -> bool:
+    return value is None or (isinstance(value, (str, list, dict)) and len(value) == 0)
+
+
+def _normalized(value) -> str:
+    return re.sub(r"[^a-z0-9]", "", str(value).lower())
+
+
+def fill_rate(records: list[dict], fields: list[str]) -> float:
+    """Fraction of (record, field) cells with a non-empty value."""
+    cells = len(records) * len(fields)
+    if not cells:
+        return 0.0
+    return sum(1 for record in records for field in fields if not _is_empty(record.get(field))) / cells
+
+
+def agreement(css_records: list[dict], llm_records: list[dict]) -> float:
+    """
+    Fraction of non-empty LLM values that the CSS extraction reproduced (compared loosely:
+    lower-cased alphanumerics, either value containing the other).
+    """
+    compared = matched = 0
+    for css_record, llm_record in zip(css_records, llm_records):
+        for field, llm_value in llm_record.items():
+            if _is_empty(llm_value) or isinstance(llm_value, (list, dict)):
+                continue
+            compared += 1
+            css_value, expected = _normalized(css_record.get(field) or ""), _normalized(llm_value)
+            if css_value and expected and (expected in css_value or css_value in expected):
+                matched += 1
+    if not compared:
+        return 0.0
+    # Penalize schemas that find a very different number of records
+    count_ratio = min(len(css_records), len(llm_records)) / max(len(css_records), len(llm_records))
+    return matched / compared * count_ratio
+
+
+def shape_result(records: list[dict], shape: str):
+    """Wraps CSS records into the response shape the LLM path would have returned."""
+    if shape == "items":
+        return {"items": records}
+    return records[0] if records else None
+
+
+class SchemaRegistry:
+    """
+    SQLite-backed store of CSS schemas learned from LLM extractions, keyed by
+    (page template, prompt hash). A schema is dropped after it fails validation
+    `max_failures` times in a row so the next LLM extraction can regenerate it.
+    Candidate schemas are validated on `cpu_pool` when one is given.
+    A template whose learning attempt failed or was rejected isn't retried for `learn_cooldown`
+    seconds, doubling with every further failure, so unlearnable templates don't cost a
+    schema-generation call on every request.
+    """
+
+    def __init__(self, path: str, min_fill_rate: float = 0.7, min_agreement: float = 0.6, max_failures: int = 2,
+                 cpu_pool: CpuPool | None = None, learn_cooldown: float = 24 * 3600):
+        self.min_fill_rate = min_fill_rate
+        self.min_agreement = min_agreement
+        self.max_failures = max_failures
+        self.learn_cooldown = learn_cooldown
+        self.cpu_pool = cpu_pool
+        self._lock = threading.Lock()
+        self._learning: set[str] = set()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS auto_schemas (
+                key TEXT PRIMARY KEY,
+                template TEXT NOT NULL,
+                schema TEXT NOT NULL,
+                shape TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                uses INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_learning_failures (
+                key TEXT PRIMARY KEY,
+                template TEXT NOT NULL,
+                failures INTEGER NOT NULL,
+                retry_after REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url: str, prompt: str | None) -> str:
+        return hash_text(f"{page_template(url)}|{(prompt or '').strip()}")
+
+    def _get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT schema, shape FROM auto_schemas WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return {"schema": json.loads(row[0]), "shape": row[1]}
+
+    def _put(self, key: str, url: str, schema: dict, shape: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO auto_schemas (key, template, schema, shape, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, page_template(url), json.dumps(schema), shape, time.time()),
+            )
+            self._conn.commit()
+
+    def _record(self, key: str, ok: bool) -> bool:
+        """Records a use of a schema; returns False if the schema was dropped."""
+        with self._lock:
+            if ok:
+                self._conn.execute("UPDATE auto_schemas SET uses = uses + 1, failures = 0 WHERE key = ?", (key,))
+            else:
+                self._conn.execute("UPDATE auto_schemas SET failures = failures + 1 WHERE key = ?", (key,))
+                self._conn.execute("DELETE FROM auto_schemas WHERE key = ? AND failures >= ?", (key, self.max_failures))
+            self._conn.commit()
+            return self._conn.execute("SELECT 1 FROM auto_schemas WHERE key = ?", (key,)).fetchone() is not None
+
+    def _learning_blocked(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT retry_after FROM schema_learning_failures WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def _record_learning(self, key: str, url: str, ok: bool):
+        with self._lock:
+            if ok:
+                self._conn.execute("DELETE FROM schema_learning_failures WHERE key = ?", (key,))
+            else:
+                row = self._conn.execute("SELECT failures FROM schema_learning_failures WHERE key = ?", (key,)).fetchone()
+                failures = (row[0] if row else 0) + 1
+                cooldown = min(self.learn_cooldown * 2 ** (failures - 1), 30 * 24 * 3600)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO schema_learning_failures (key, template, failures, retry_after) VALUES (?, ?, ?, ?)",
+                    (key, page_template(url), failures, time.time() + cooldown),
+                )
+            self._conn.commit()
+
+    async def get(self, url: str, prompt: str | None):
+        """Returns {"schema": ..., "shape": ...} for the URL's template, or None."""
+        return await asyncio.to_thread(self._get, self.make_key(url, prompt))
+
+    async def record(self, url: str, prompt: str | None, ok: bool) -> bool:
+        return await asyncio.to_thread(self._record, self.make_key(url, prompt), ok)
+
+    def validate_records(self, records: list[dict], schema: dict) -> bool:
+        """Checks a CSS extraction made with a stored schema: records found and fields mostly filled."""
+        fields = [field["name"] for field in schema.get("fields", []) if "name" in field]
+        return bool(records) and fill_rate(records, fields) >= self.min_fill_rate
+
+    async def learn(self, url: str, prompt: str | None, html: str, llm_data, model_name: str) -> bool:
+        """
+        Asks the LLM for a CSS schema reproducing `llm_data` from `html`, validates it by running it
+        over the same HTML and stores it if it agrees with the LLM output. Returns True if stored.
+        """
+        shape = shape_of(llm_data)
+        key = self.make_key(url, prompt)
+        if shape is None or key in self._learning:
+            return False
+        if await asyncio.to_thread(self._learning_blocked, key):
+            logger.debug(f"Skipping CSS schema learning for {page_template(url)}: cooling down after a failed attempt")
+            return False
+        self._learning.add(key)
+        try:
+            learned = await self._generate_schema(key, url, html, llm_data, shape, model_name)
+            await asyncio.to_thread(self._record_learning, key, url, learned)
+            return learned
+        finally:
+            self._learning.discard(key)
+
+    async def _generate_schema(self, key: str, url: str, html: str, llm_data, shape: str, model_name: str) -> bool:
+        try:
+            llm_records = records_of(llm_data, shape)
+            shape_rule = (
+                "baseSelector must match every repeated record on the page."
+                if shape == "items" else
+                "The page holds a single record: baseSelector must match exactly one element containing all fields."
+            )
+            prompt_text = SCHEMA_GENERATION_PROMPT.format(
+                shape_rule=shape_rule,
+                examples=json.dumps(llm_records[:3], indent=2),
+                html=strip_html_noise(html)[:SCHEMA_GENERATION_HTML_LIMIT],
+            )
+            response = await gemini_client.generate_content(
+                model_name, prompt_text, generation_config={"response_mime_type": "application/json"}
+            )
+            raw_text = getattr(response, "text", None) or ""
+            schema = json.loads(raw_text.strip().removeprefix("```json").removesuffix("```").strip())
+            if not isinstance(schema, dict) or not schema.get("baseSelector") or not schema.get("fields"):
+                logger.warning(f"LLM returned an invalid CSS schema for {page_template(url)}")
+                return False
+
+            if self.cpu_pool:
+                css_records = await self.cpu_pool.run(run_css_schema, schema, url, html)
+            else:
+                css_records = await asyncio.to_thread(run_css_schema, schema, url, html)
+            if shape == "object":
+                css_records = css_records[:1]
+            score = agreement(css_records, llm_records)
+            if score < self.min_agreement:
+                logger.info(f"Generated CSS schema for {page_template(url)} rejected (agreement {score:.2f})")
+                return False
+            await asyncio.to_thread(self._put, key, url, schema, shape)
+            logger.info(f"Learned CSS schema for {page_template(url)} (agreement {score:.2f})")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to learn CSS schema for {page_template(url)}: {e}")
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            size, uses = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(uses), 0) FROM auto_schemas").fetchone()
+            cooling_down = self._conn.execute(
+                "SELECT COUNT(*) FROM schema_learning_failures WHERE retry_after > ?", (time.time(),)
+            ).fetchone()[0]
+        return {"schemas": size, "uses": uses, "learning": len(self._learning), "cooling_down": cooling_down}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
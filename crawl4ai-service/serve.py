@@ -0,0 +1,29 @@
+"""
+Starts the service with WEB_CONCURRENCY uvicorn worker processes (default 1) on HOST:PORT (default 0.0.0.0:8001).
+
+Each worker owns its crawler pool and event loop, so JSON parsing, HTML filtering and extraction scale
+past one core. Workers share the SQLite stores (extraction cache, learned schemas, fingerprints, job queue,
+per-domain politeness state) and crawl4ai's page cache, which are all local files in WAL mode. With several
+workers, metrics are collected across processes in PROMETHEUS_MULTIPROC_DIR, which is emptied on start.
+
+Run: WEB_CONCURRENCY=4 python serve.py
+"""
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+
+def main():
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Must be set before the workers import prometheus_client; values left by a previous run are stale
+        metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "crawl4ai-metrics"))
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+    uvicorn.run("main:app", host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8001")), workers=workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight work: while a call for `key` is running, further calls
+    with the same key await the same task instead of starting their own.
+
+    The work runs in its own task, shielded from individual callers: a caller that is
+    cancelled (e.g. client disconnect) only stops waiting. The work itself is cancelled
+    once its last waiter is gone. Exceptions raised by the work are re-raised to every waiter.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, _Call] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(task=asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task, key=key, call=call: self._forget(key, call))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Joining in-flight request {key[:16]} ({call.waiters} already waiting)")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every caller gave up: stop the work and make sure new callers start fresh
+                self._forget(key, call)
+                call.task.cancel()
+
+    def in_flight(self, key: str) -> bool:
+        """True if a call for `key` is running, i.e. do(key, ...) would join it."""
+        return key in self._calls
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "started": self.started, "coalesced": self.coalesced}
@@ -0,0 +1,133 @@
+import re
+
+from content_reduction import chunk_text, dedupe_chunked_result, estimate_tokens, html_to_compact_text, merge_extractions
+
+
+def test_compact_text_keeps_headings_lists_links_and_images():
+    html = ('<h2>Listing</h2><ul><li><a href="/detail/1">12 Oak St</a></li></ul>'
+            '<img src="/img/1.jpg" alt="Front">')
+    text = html_to_compact_text(html)
+    assert "## Listing" in text
+    assert "- [12 Oak St](/detail/1)" in text
+    assert "![Front](/img/1.jpg)" in text
+
+
+def test_compact_text_drops_scripts_styles_and_svg():
+    html = "<script>var x = 1;</script><style>p {}</style><svg><path d='M0'/></svg><p>Price 100000</p>"
+    assert html_to_compact_text(html) == "Price 100000"
+
+
+def test_compact_text_drops_tracking_links_and_pixels():
+    html = ('<p><a href="https://ad.doubleclick.net/click">Sponsored</a></p>'
+            '<img src="https://www.google-analytics.com/collect?v=1">')
+    text = html_to_compact_text(html)
+    assert "doubleclick" not in text
+    assert "google-analytics" not in text
+    assert "Sponsored" in text
+
+
+def test_void_noise_tag_does_not_swallow_the_rest_of_the_page():
+    assert html_to_compact_text("<p>before</p><embed src=x><p>Price 100000</p>") == "before\n\nPrice 100000"
+
+
+def test_head_without_end_tag_ends_at_body():
+    assert html_to_compact_text("<head><title>t</title><body><p>Price</p>") == "Price"
+
+
+def test_head_without_end_tag_ends_at_page_content():
+    assert html_to_compact_text("<head><title>t</title><meta charset=utf-8><p>Price</p>") == "Price"
+
+
+def test_head_content_is_dropped():
+    html = "<html><head><title>Title</title><style>p {}</style></head><body><p>Body</p></body></html>"
+    assert html_to_compact_text(html) == "Body"
+
+
+def test_estimate_tokens_rounds_up():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_chunk_text_returns_small_text_whole():
+    assert chunk_text("short text", max_tokens=100) == ["short text"]
+
+
+def test_chunk_text_respects_size_and_covers_all_lines():
+    lines = [f"line {i:03d} " + "x" * 30 for i in range(200)]
+    text = "\n".join(lines)
+    chunks = chunk_text(text, max_tokens=100)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    joined = "".join(chunks)
+    assert all(line in joined for line in lines)
+
+
+def test_chunk_text_splits_on_line_boundaries():
+    text = "\n".join("y" * 50 for _ in range(40))
+    chunks = chunk_text(text, max_tokens=100)
+    assert "".join(chunks) == text # No overlap: consecutive chunks
+    position = 0
+    for chunk in chunks[:-1]:
+        position += len(chunk)
+        assert text[position] == "\n"
+
+
+def test_chunk_text_overlaps_consecutive_chunks():
+    text = "\n".join(f"record {i:03d}" for i in range(300))
+    chunks = chunk_text(text, max_tokens=100, overlap_tokens=20)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous[-40:] in current
+
+
+def test_chunk_text_without_newlines_still_terminates():
+    chunks = chunk_text("z" * 1000, max_tokens=50, overlap_tokens=10)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert chunks[-1].endswith("z")
+
+
+def test_merge_items_deduplicates_by_url():
+    merged = merge_extractions([
+        {"items": [{"url": "/a", "price": 1}, {"url": "/b", "price": 2}]},
+        {"items": [{"url": "/b", "price": 2}, {"url": "/c", "price": 3}]},
+    ])
+    assert merged == {"items": [{"url": "/a", "price": 1}, {"url": "/b", "price": 2}, {"url": "/c", "price": 3}]}
+
+
+def test_merge_items_deduplicates_by_content_without_url():
+    merged = merge_extractions([[{"title": "A"}], {"items": [{"title": "A"}, {"title": "B"}]}])
+    assert merged == {"items": [{"title": "A"}, {"title": "B"}]}
+
+
+def test_merge_objects_keeps_first_non_empty_value():
+    merged = merge_extractions([
+        {"title": "House", "price": None, "rooms": []},
+        {"title": "Other", "price": 250000, "rooms": [3]},
+    ])
+    assert merged == {"title": "House", "price": 250000, "rooms": [3]}
+
+
+def test_merge_ignores_missing_results():
+    assert merge_extractions([]) is None
+    assert merge_extractions([None, None]) is None
+    assert merge_extractions([None, {"title": "A"}]) == {"title": "A"}
+
+
+def test_dedupe_chunked_result_drops_records_repeated_in_chunk_overlap():
+    text = "\n".join(f"- [Listing {n}](/detail/{n}) $ {n}00000" for n in range(1, 41))
+    chunks = chunk_text(text, max_tokens=300, overlap_tokens=40)
+    assert len(chunks) == 2
+    # Per-chunk extraction, concatenated the way crawl4ai returns chunked LLM results
+    concatenated = [
+        {"url": url, "title": title, "error": False}
+        for chunk in chunks for title, url in re.findall(r"\[(Listing \d+)\]\((/detail/\d+)\)", chunk)
+    ]
+    assert len(concatenated) > 40
+    deduped = dedupe_chunked_result(concatenated)
+    assert [record["url"] for record in deduped] == [f"/detail/{n}" for n in range(1, 41)]
+
+
+def test_dedupe_chunked_result_keeps_shape():
+    assert dedupe_chunked_result({"items": [{"title": "A"}, {"title": "A"}], "page": 1}) == {"items": [{"title": "A"}], "page": 1}
+    assert dedupe_chunked_result({"title": "House"}) == {"title": "House"}
+
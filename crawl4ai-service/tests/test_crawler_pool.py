@@ -0,0 +1,140 @@
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip("crawl4ai")
+
+import crawler_pool # noqa: E402
+from crawler_pool import CrawlerPool, PoolNotReady, header_profile_key # noqa: E402
+
+
+class FakeCrawler:
+    """Stands in for AsyncWebCrawler: records starts, closes and rendered URLs."""
+
+    def __init__(self, config=None):
+        self.config = config
+        self.crawler_strategy = types.SimpleNamespace(set_hook=lambda hook_type, hook: None)
+        self.rendered = []
+        self.closed = False
+
+    async def start(self):
+        await asyncio.sleep(0.01)
+
+    async def arun(self, url, config=None):
+        self.rendered.append(url)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_browsers(monkeypatch):
+    monkeypatch.setattr(crawler_pool, "AsyncWebCrawler", FakeCrawler)
+    monkeypatch.setattr(crawler_pool, "BrowserConfig", lambda **kwargs: kwargs)
+    monkeypatch.setattr(crawler_pool, "CrawlerRunConfig", lambda **kwargs: kwargs)
+    monkeypatch.setattr(crawler_pool, "_direct_children", lambda: {})
+
+
+def test_header_profile_key_ignores_name_case_and_order():
+    assert header_profile_key({"User-Agent": "a", "Accept": "b"}) == header_profile_key({"accept": "b", "user-agent": "a"})
+    assert header_profile_key({"User-Agent": "a"}) != header_profile_key({"User-Agent": "b"})
+
+
+def test_default_profile_is_warmed_up_and_reused(fake_browsers):
+    async def run():
+        pool = CrawlerPool({"User-Agent": "default"})
+        await pool.start()
+        await pool.wait_ready()
+        async with pool.acquire() as first:
+            pass
+        async with pool.acquire({"user-agent": "default"}) as second:
+            pass
+        stats = pool.stats()
+        await pool.close()
+        return first, second, stats
+
+    first, second, stats = asyncio.run(run())
+    assert first is second and first.rendered == [crawler_pool.WARM_UP_URL]
+    assert stats["ready"] and stats["hits"] == 2 and stats["misses"] == 0
+    assert first.closed
+
+
+def test_concurrent_checkouts_of_a_new_profile_share_one_launch(fake_browsers):
+    async def run():
+        pool = CrawlerPool({"User-Agent": "default"})
+        await pool.start()
+        await pool.wait_ready()
+
+        async def use():
+            async with pool.acquire({"User-Agent": "custom"}) as crawler:
+                await asyncio.sleep(0.01)
+                return crawler
+
+        crawlers = await asyncio.gather(*[use() for _ in range(5)])
+        stats = pool.stats()
+        await pool.close()
+        return crawlers, stats
+
+    crawlers, stats = asyncio.run(run())
+    assert len({id(crawler) for crawler in crawlers}) == 1
+    assert stats["misses"] == 1 and stats["size"] == 2
+
+
+def test_least_recently_used_idle_profile_is_evicted_when_full(fake_browsers):
+    async def run():
+        pool = CrawlerPool({"User-Agent": "default"}, max_size=2)
+        await pool.start()
+        await pool.wait_ready()
+        async with pool.acquire({"User-Agent": "first"}) as evicted:
+            pass
+        async with pool.acquire({"User-Agent": "second"}):
+            pass
+        stats = pool.stats()
+        await pool.close()
+        return evicted, stats
+
+    evicted, stats = asyncio.run(run())
+    assert evicted.closed
+    assert stats["evictions"] == 1 and stats["size"] == 2
+
+
+def test_browser_is_recycled_after_max_navigations(fake_browsers):
+    async def run():
+        pool = CrawlerPool({"User-Agent": "default"}, max_navigations=2)
+        await pool.start()
+        await pool.wait_ready()
+        async with pool.acquire() as old:
+            pool.count_navigation(old)
+            pool.count_navigation(old)
+        for _ in range(100):
+            if pool.stats()["recycles"]:
+                break
+            await asyncio.sleep(0.01)
+        async with pool.acquire() as fresh:
+            pass
+        await pool.close()
+        return old, fresh
+
+    old, fresh = asyncio.run(run())
+    assert old is not fresh and old.closed
+    assert fresh.rendered == [crawler_pool.WARM_UP_URL]
+
+
+def test_checkout_gives_up_when_the_default_browser_never_starts(fake_browsers, monkeypatch):
+    async def never_starts(self):
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(FakeCrawler, "start", never_starts)
+
+    async def run():
+        pool = CrawlerPool({"User-Agent": "default"}, ready_timeout=0.05)
+        await pool.start()
+        try:
+            async with pool.acquire():
+                pass
+        finally:
+            await pool.close()
+
+    with pytest.raises(PoolNotReady):
+        asyncio.run(run())
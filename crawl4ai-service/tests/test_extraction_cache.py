@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from extraction_cache import ExtractionCache, hash_instruction, normalize_url
+
+
+def test_normalize_url_drops_tracking_params_fragments_and_default_ports():
+    assert normalize_url("HTTPS://Example.com:443/homes?utm_source=x&b=2&a=1&gclid=abc#photos") == "https://example.com/homes?a=1&b=2"
+    assert normalize_url("http://example.com:8080") == "http://example.com:8080/"
+
+
+def test_key_depends_on_url_instruction_and_content():
+    prompt = hash_instruction("List every home", None)
+    key = ExtractionCache.make_key("https://example.com/homes?utm_medium=mail", prompt, "content-1")
+    assert key == ExtractionCache.make_key("https://example.com/homes", prompt, "content-1")
+    assert key != ExtractionCache.make_key("https://example.com/homes", prompt, "content-2")
+    assert key != ExtractionCache.make_key("https://example.com/homes", hash_instruction("List prices", None), "content-1")
+    assert key != ExtractionCache.make_key("https://example.com/other", prompt, "content-1")
+
+
+def test_instruction_hash_separates_prompts_from_schemas():
+    assert hash_instruction(" List homes ", None) == hash_instruction("List homes", None)
+    assert hash_instruction(None, {"b": 1, "a": 2}) == hash_instruction(None, {"a": 2, "b": 1})
+    assert hash_instruction("x", {"a": 1}) != hash_instruction("x", None)
+
+
+def test_put_then_get_round_trips_and_counts_hits(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.db"))
+
+    async def round_trip():
+        await cache.put("key", "https://example.com/", {"items": [{"price": 1}]})
+        return await cache.get("key"), await cache.get("missing")
+
+    assert asyncio.run(round_trip()) == ({"items": [{"price": 1}]}, None)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    cache.close()
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.db"), ttl=0.05)
+
+    async def expire():
+        await cache.put("key", "https://example.com/", {"title": "House"})
+        await asyncio.sleep(0.1)
+        return await cache.get("key")
+
+    assert asyncio.run(expire()) is None
+    assert cache.stats()["size"] == 0 and cache.stats()["evictions"] == 1
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted_past_max_entries(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.db"), max_entries=2)
+
+    async def fill():
+        await cache.put("a", "https://example.com/a", 1)
+        time.sleep(0.01)
+        await cache.put("b", "https://example.com/b", 2)
+        time.sleep(0.01)
+        await cache.get("a") # Refreshes a: b is now the least recently used
+        time.sleep(0.01)
+        await cache.put("c", "https://example.com/c", 3)
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(fill()) == [1, None, 3]
+    cache.close()
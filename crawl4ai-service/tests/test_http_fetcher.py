@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+
+from http_fetcher import JS_SHELL_REASONS, FetchModeRegistry, HttpFetcher, domain_of, is_bot_challenge, needs_browser
+
+SERVER_RENDERED = "<html><body><main>" + "<p>Three bedroom house with garden, close to the station.</p>" * 60 + "</main></body></html>"
+
+
+def test_server_rendered_page_needs_no_browser():
+    assert needs_browser(SERVER_RENDERED) is None
+
+
+def test_empty_app_root_needs_javascript_rendering():
+    assert needs_browser('<html><body><div id="root"></div><script src="/app.js"></script></body></html>') == "javascript rendering"
+    assert needs_browser("<html><body><noscript>This site requires JavaScript</noscript></body></html>") == "javascript rendering"
+
+
+def test_state_bootstrap_needs_javascript_rendering():
+    html = SERVER_RENDERED.replace("</body>", "<script>window.__NUXT__ = {}</script></body>")
+    assert needs_browser(html) == "javascript rendering"
+
+
+def test_thin_page_has_too_little_visible_text():
+    assert needs_browser("<html><body><p>Loading...</p><script>" + "x" * 5000 + "</script></body></html>") == "too little visible text"
+
+
+def test_bot_wall_is_not_a_js_shell():
+    wall = "<html><body><h1>Are you a robot?</h1><div class='px-captcha'></div></body></html>"
+    assert is_bot_challenge(wall)
+    assert needs_browser(wall) == "bot challenge"
+    assert needs_browser(wall) not in JS_SHELL_REASONS
+
+
+def test_captcha_script_on_a_content_page_is_not_a_bot_wall():
+    html = SERVER_RENDERED.replace("</body>", "<script src='https://www.google.com/recaptcha/api.js'></script></body>")
+    assert not is_bot_challenge(html)
+    assert needs_browser(html) is None
+
+
+def test_domain_of_lowercases_host():
+    assert domain_of("https://WWW.Example.com:8443/homes?page=2") == "www.example.com"
+
+
+def test_fetch_mode_registry_expires_decisions():
+    registry = FetchModeRegistry(ttl=60)
+    registry.set("example.com", "browser")
+    registry.set("other.com", "http")
+    assert registry.get("example.com") == "browser"
+    assert registry.stats() == {"http_domains": 1, "browser_domains": 1}
+    registry._modes["example.com"] = ("browser", registry._modes["example.com"][1] - 61)
+    assert registry.get("example.com") is None
+
+
+def test_fetcher_sends_conditional_headers_but_keeps_its_encodings():
+    seen = {}
+
+    def handler(request):
+        seen.update(request.headers)
+        return httpx.Response(304, headers={"ETag": '"v2"'})
+
+    fetcher = HttpFetcher({"User-Agent": "test", "Accept-Encoding": "gzip, deflate, br"})
+    fetcher._client = httpx.AsyncClient(headers=fetcher._client.headers, transport=httpx.MockTransport(handler))
+
+    async def fetch():
+        result = await fetcher.fetch("https://example.com/", {"If-None-Match": '"v1"', "Accept-Encoding": "br"})
+        await fetcher.close()
+        return result
+
+    result = asyncio.run(fetch())
+    assert result.status_code == 304 and result.headers["etag"] == '"v2"'
+    assert seen["if-none-match"] == '"v1"'
+    assert seen["accept-encoding"] == "gzip, deflate"
+    assert seen["user-agent"] == "test"
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import job_queue
+from job_queue import JobQueue, JobWorkerPool, QueueFull
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    yield queue
+    queue.close()
+
+
+def test_jobs_are_claimed_in_submission_order(queue):
+    first, _ = queue.enqueue({"url": "https://example.com/1"})
+    second, depth = queue.enqueue({"url": "https://example.com/2"})
+    assert depth == 2
+    assert queue.claim_next()["id"] == first
+    assert queue.claim_next()["id"] == second
+    assert queue.claim_next() is None
+
+
+def test_enqueue_rejects_jobs_past_max_depth(queue):
+    queue.enqueue({"url": "https://example.com/1"}, max_depth=2)
+    queue.enqueue({"url": "https://example.com/2"}, max_depth=2)
+    with pytest.raises(QueueFull) as rejected:
+        queue.enqueue({"url": "https://example.com/3"}, max_depth=2)
+    assert rejected.value.depth == 2
+    assert queue.depth() == 2
+    queue.claim_next() # Running jobs don't count towards the depth
+    assert queue.enqueue({"url": "https://example.com/3"}, max_depth=2)[1] == 2
+
+
+def test_finish_records_result_or_error(queue):
+    ok, _ = queue.enqueue({"url": "https://example.com/ok"})
+    failed, _ = queue.enqueue({"url": "https://example.com/failed"})
+    queue.claim_next()
+    queue.claim_next()
+    queue.finish(ok, result={"success": True})
+    queue.finish(failed, error="Crawl failed")
+    assert queue.get(ok)["status"] == "succeeded" and queue.get(ok)["result"] == {"success": True}
+    assert queue.get(failed)["status"] == "failed" and queue.get(failed)["error"] == "Crawl failed"
+    assert queue.stats()["succeeded"] == 1 and queue.stats()["failed"] == 1
+
+
+def test_jobs_without_recent_heartbeat_are_requeued(queue):
+    job_id, _ = queue.enqueue({"url": "https://example.com/"})
+    queue.claim_next()
+    assert queue.requeue_interrupted(stale_after=60) == 0
+    time.sleep(0.05)
+    assert queue.requeue_interrupted(stale_after=0.01) == 1
+    job = queue.claim_next()
+    assert job["id"] == job_id and job["attempts"] == 2
+
+
+def test_heartbeat_keeps_running_job(queue):
+    job_id, _ = queue.enqueue({"url": "https://example.com/"})
+    queue.claim_next()
+    time.sleep(0.05)
+    queue.heartbeat([job_id])
+    assert queue.requeue_interrupted(stale_after=0.04) == 0
+
+
+def test_retry_after_estimates_time_to_drain_the_queue(queue):
+    pool = JobWorkerPool(queue, handler=None, workers=2)
+    for n in range(4):
+        queue.enqueue({"url": f"https://example.com/{n}"})
+    assert pool.retry_after() == 10 # No finished jobs yet: 5s per job assumed
+
+
+def test_workers_run_jobs_and_record_failures(queue):
+    async def handler(payload):
+        if payload["url"].endswith("bad"):
+            raise ValueError("Crawl failed")
+        return {"success": True, "url": payload["url"]}
+
+    async def run():
+        pool = JobWorkerPool(queue, handler, workers=2)
+        good, _ = queue.enqueue({"url": "https://example.com/good"})
+        bad, _ = queue.enqueue({"url": "https://example.com/bad"})
+        pool.start()
+        pool.notify()
+        for _ in range(100):
+            if queue.stats()["queued"] == 0 and queue.stats()["running"] == 0:
+                break
+            await asyncio.sleep(0.02)
+        await pool.stop()
+        return queue.get(good), queue.get(bad)
+
+    good, bad = asyncio.run(run())
+    assert good["status"] == "succeeded" and good["result"]["url"] == "https://example.com/good"
+    assert bad["status"] == "failed" and bad["error"] == "Crawl failed"
+
+
+def test_retry_after_counts_workers_of_every_process(queue):
+    pool = JobWorkerPool(queue, handler=None, workers=2, total_workers=8)
+    for n in range(16):
+        queue.enqueue({"url": f"https://example.com/{n}"})
+    assert pool.retry_after() == 10 # 16 jobs * 5s / 8 workers
+
+
+def test_webhook_retries_without_sleeping_after_the_last_attempt(queue, monkeypatch):
+    sleeps = []
+    calls = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    client = httpx.AsyncClient
+    monkeypatch.setattr(job_queue.httpx, "AsyncClient", lambda **kwargs: client(transport=httpx.MockTransport(handler), **kwargs))
+    monkeypatch.setattr(job_queue.asyncio, "sleep", sleep)
+    job_id, _ = queue.enqueue({"url": "https://example.com/"}, "https://hooks.example.com/done")
+    queue.claim_next()
+    queue.finish(job_id, result={"success": True})
+
+    asyncio.run(JobWorkerPool(queue, handler=None)._send_webhook(job_id, "https://hooks.example.com/done", attempts=3))
+    assert len(calls) == 3
+    assert sleeps == [2, 4]
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from extraction_cache import hash_instruction
+from page_fingerprints import FingerprintStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FingerprintStore(str(tmp_path / "page_fingerprints.db"))
+    yield store
+    store.close()
+
+
+def test_fingerprints_are_kept_per_url_and_instruction(store):
+    prompt, other_prompt = hash_instruction("List homes", None), hash_instruction("List agents", None)
+
+    async def scrape_twice():
+        await store.put("https://example.com/homes?utm_source=mail", prompt, '"v1"', None, "fingerprint-1")
+        return await store.get("https://example.com/homes", prompt), await store.get("https://example.com/homes", other_prompt)
+
+    previous, other = asyncio.run(scrape_twice())
+    assert previous["etag"] == '"v1"' and previous["fingerprint"] == "fingerprint-1"
+    assert other is None
+
+
+def test_later_scrape_replaces_the_fingerprint(store):
+    prompt = hash_instruction("List homes", None)
+
+    async def scrape_twice():
+        await store.put("https://example.com/homes", prompt, '"v1"', None, "fingerprint-1")
+        await store.put("https://example.com/homes", prompt, None, "Wed, 01 Jan 2025 00:00:00 GMT", "fingerprint-2")
+        return await store.get("https://example.com/homes", prompt)
+
+    latest = asyncio.run(scrape_twice())
+    assert latest["fingerprint"] == "fingerprint-2" and latest["etag"] is None
+    assert store.stats()["pages"] == 1
+
+
+def test_conditional_headers_use_stored_validators():
+    assert FingerprintStore.conditional_headers(None) == {}
+    assert FingerprintStore.conditional_headers({"etag": '"v1"', "last_modified": "Wed, 01 Jan 2025 00:00:00 GMT"}) == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Wed, 01 Jan 2025 00:00:00 GMT",
+    }
@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+from politeness import DomainLimits, DomainScheduler, DomainStateStore, FairSlots, TokenBucket
+
+
+def test_bucket_spends_burst_then_waits_for_refill():
+    limits = DomainLimits(rate=2, burst=2)
+    bucket = TokenBucket(tokens=2, current_rate=2, last_refill=100.0)
+    assert bucket.take(limits, 100.0) == 0
+    assert bucket.take(limits, 100.0) == 0
+    assert bucket.take(limits, 100.0) == 0.5
+    assert bucket.take(limits, 100.5) == 0
+
+
+def test_bucket_throttle_halves_rate_and_backs_off_exponentially():
+    limits = DomainLimits(rate=4, burst=2)
+    bucket = TokenBucket(tokens=2, current_rate=4)
+    assert bucket.throttle(limits, 100.0, max_backoff=300, retry_after=None) == 2.0
+    assert bucket.current_rate == 2
+    assert bucket.throttle(limits, 100.0, max_backoff=300, retry_after=None) == 4.0
+    assert bucket.take(limits, 103.0) == 1.0 # Still paused until 104
+    bucket.recover(limits)
+    assert bucket.backoff == 0
+    assert bucket.current_rate == 1.4
+
+
+def test_bucket_honours_retry_after_up_to_max_backoff():
+    limits = DomainLimits(rate=1, burst=1)
+    assert TokenBucket(tokens=1, current_rate=1).throttle(limits, 0.0, max_backoff=300, retry_after="60") == 60
+    assert TokenBucket(tokens=1, current_rate=1).throttle(limits, 0.0, max_backoff=30, retry_after="600") == 30
+    assert TokenBucket(tokens=1, current_rate=1).throttle(limits, 0.0, max_backoff=30, retry_after="soon") == 2
+
+
+def test_overrides_cover_subdomains():
+    scheduler = DomainScheduler(DomainLimits(rate=1), overrides={"example.com": DomainLimits(rate=5)})
+    assert scheduler.limits_for("www.example.com").rate == 5
+    assert scheduler.limits_for("example.com").rate == 5
+    assert scheduler.limits_for("notexample.com").rate == 1
+
+
+def test_report_pauses_domain_on_throttling_status():
+    scheduler = DomainScheduler(DomainLimits(rate=1, burst=1))
+    assert asyncio.run(scheduler.report("https://example.com/a", 429, retry_after="30")) is True
+    assert scheduler._state("example.com").bucket.blocked_until > time.time() + 25
+    assert asyncio.run(scheduler.report("https://other.com/a", 200, "<p>fine</p>")) is False
+
+
+def test_report_treats_challenge_page_but_not_recaptcha_script_as_throttling():
+    scheduler = DomainScheduler(DomainLimits())
+    challenge = "<html><title>Just a moment...</title><div id='cf-challenge'>Checking your browser</div></html>"
+    assert asyncio.run(scheduler.report("https://walled.com/", 200, challenge)) is True
+    contact_form = "<script src='https://www.google.com/recaptcha/api.js'></script>" + "<p>" + "Spacious family home. " * 200 + "</p>"
+    assert asyncio.run(scheduler.report("https://agency.com/", 200, contact_form)) is False
+
+
+def test_slot_caps_fetches_per_domain():
+    scheduler = DomainScheduler(DomainLimits(rate=1000, burst=1000, concurrency=2))
+    in_flight, peak = 0, 0
+
+    async def fetch():
+        nonlocal in_flight, peak
+        async with scheduler.slot("https://example.com/"):
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.02)
+            in_flight -= 1
+
+    async def fetches():
+        await asyncio.gather(*(fetch() for _ in range(6)))
+
+    asyncio.run(fetches())
+    assert peak == 2
+
+
+def run_batch(slots: FairSlots, urls: list[str], hold: float = 0.05) -> int:
+    """Runs every URL through the batch slots, holding each for `hold` seconds; returns the peak in flight."""
+    in_flight, peak = 0, 0
+
+    async def item(url):
+        nonlocal in_flight, peak
+        async with slots.slot(url):
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(hold) # Stands in for extraction, which holds no domain slot
+            in_flight -= 1
+
+    async def batch():
+        await asyncio.gather(*(item(url) for url in urls))
+
+    asyncio.run(batch())
+    return peak
+
+
+def test_same_domain_batch_reaches_requested_concurrency():
+    scheduler = DomainScheduler(DomainLimits(rate=100, burst=100, concurrency=2))
+    urls = [f"https://example.com/listing/{n}" for n in range(10)]
+    assert run_batch(FairSlots(scheduler, 5), urls) == 5
+
+
+def test_batch_never_exceeds_its_concurrency():
+    scheduler = DomainScheduler(DomainLimits(rate=100, burst=100, concurrency=2))
+    urls = [f"https://site{n % 3}.com/page/{n}" for n in range(12)]
+    assert run_batch(FairSlots(scheduler, 4), urls) == 4
+
+
+def test_paused_domain_does_not_hold_batch_slots():
+    scheduler = DomainScheduler(DomainLimits(rate=100, burst=100, concurrency=2))
+    scheduler._state("slow.com").bucket.blocked_until = time.time() + 1.0
+    slots = FairSlots(scheduler, 1)
+    finished = {}
+
+    async def item(url):
+        async with slots.slot(url):
+            finished[url] = time.monotonic()
+
+    async def batch():
+        started = time.monotonic()
+        await asyncio.gather(*(item(url) for url in ["https://slow.com/1", "https://slow.com/2", "https://fast.com/1"]))
+        return started
+
+    started = asyncio.run(batch())
+    assert finished["https://fast.com/1"] - started < 0.5
+    assert finished["https://slow.com/1"] - started >= 0.9
+
+
+def test_stats_reads_shared_buckets(tmp_path):
+    store = DomainStateStore(str(tmp_path / "domain_state.db"))
+    scheduler = DomainScheduler(DomainLimits(rate=2, burst=2, concurrency=1), store=store)
+
+    async def scrape_and_report():
+        async with scheduler.slot("https://example.com/1"):
+            pass
+        return await scheduler.stats()
+
+    stats = asyncio.run(scrape_and_report())
+    store.close()
+    assert stats["example.com"]["requests"] == 1
+    assert stats["example.com"]["concurrency"] == 1
+
+
+def test_shared_store_caps_slots_across_stores(tmp_path):
+    # Two stores on one file stand in for two worker processes
+    path = str(tmp_path / "domain_state.db")
+    first, second = DomainStateStore(path), DomainStateStore(path)
+
+    async def leases():
+        lease = await first.acquire_slot("example.com", 1)
+        blocked = await second.acquire_slot("example.com", 1)
+        await first.release_slot(lease)
+        return lease, blocked, await second.acquire_slot("example.com", 1)
+
+    lease, blocked, after_release = asyncio.run(leases())
+    first.close()
+    second.close()
+    assert lease and blocked is None and after_release
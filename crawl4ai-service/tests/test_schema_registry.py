@@ -0,0 +1,109 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+pytest.importorskip("crawl4ai")
+pytest.importorskip("google.generativeai")
+
+import gemini_client # noqa: E402
+from schema_registry import SchemaRegistry, agreement, page_template, records_of, shape_of # noqa: E402
+
+LISTING_HTML = """
+<html><body>
+<article class="card"><h2 class="title">12 Oak St</h2><span class="price">$450,000</span><a class="link" href="/homes/1">View</a></article>
+<article class="card"><h2 class="title">3 Elm Ave</h2><span class="price">$615,000</span><a class="link" href="/homes/2">View</a></article>
+</body></html>
+"""
+LLM_DATA = {"items": [
+    {"title": "12 Oak St", "price": "$450,000", "url": "/homes/1"},
+    {"title": "3 Elm Ave", "price": "$615,000", "url": "/homes/2"},
+]}
+GOOD_SCHEMA = {
+    "name": "Listings",
+    "baseSelector": "article.card",
+    "fields": [
+        {"name": "title", "selector": ".title", "type": "text"},
+        {"name": "price", "selector": ".price", "type": "text"},
+        {"name": "url", "selector": "a.link", "type": "attribute", "attribute": "href"},
+    ],
+}
+WRONG_SCHEMA = {**GOOD_SCHEMA, "fields": [{"name": "title", "selector": ".price", "type": "text"}]}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    registry = SchemaRegistry(str(tmp_path / "auto_schemas.db"), learn_cooldown=3600)
+    yield registry
+    registry.close()
+
+
+@pytest.fixture
+def schema_llm(monkeypatch):
+    """Makes gemini_client answer schema requests with `schema_llm.schema`, counting the calls."""
+    llm = types.SimpleNamespace(schema=GOOD_SCHEMA, calls=0)
+
+    async def generate_content(model_name, prompt, **kwargs):
+        llm.calls += 1
+        return types.SimpleNamespace(text=json.dumps(llm.schema))
+
+    monkeypatch.setattr(gemini_client, "generate_content", generate_content)
+    return llm
+
+
+def test_page_template_replaces_id_segments():
+    assert page_template("https://Example.com/homes/12345/photos?x=1") == "example.com/homes/:id/photos"
+    assert SchemaRegistry.make_key("https://example.com/homes/1", "List homes") == SchemaRegistry.make_key("https://example.com/homes/2", " List homes ")
+
+
+def test_shape_and_records():
+    assert shape_of({"items": [{"a": 1}]}) == "items"
+    assert shape_of({"items": []}) is None
+    assert shape_of({"title": "House"}) == "object"
+    assert records_of([{"a": 1}, "noise"], "items") == [{"a": 1}]
+    assert records_of([{"a": 1}, {"a": 2}], "object") == [{"a": 1}]
+
+
+def test_agreement_penalizes_different_record_counts():
+    llm_records = LLM_DATA["items"]
+    assert agreement(llm_records, llm_records) == 1.0
+    assert agreement(llm_records[:1], llm_records) == 0.5
+
+
+def test_validate_records_requires_mostly_filled_fields(registry):
+    assert registry.validate_records(LLM_DATA["items"], GOOD_SCHEMA)
+    assert not registry.validate_records([], GOOD_SCHEMA)
+    assert not registry.validate_records([{"title": "12 Oak St", "price": None, "url": ""}], GOOD_SCHEMA)
+
+
+def test_learned_schema_is_stored_and_dropped_after_repeated_failures(registry, schema_llm):
+    url = "https://example.com/homes?page=1"
+    assert asyncio.run(registry.learn(url, "List homes", LISTING_HTML, LLM_DATA, "model"))
+    assert asyncio.run(registry.get("https://example.com/homes?page=2", "List homes"))["schema"] == GOOD_SCHEMA
+    assert asyncio.run(registry.record(url, "List homes", ok=False)) is True
+    assert asyncio.run(registry.record(url, "List homes", ok=False)) is False # max_failures reached: stale
+    assert asyncio.run(registry.get(url, "List homes")) is None
+
+
+def test_success_resets_failure_count(registry, schema_llm):
+    url = "https://example.com/homes"
+    asyncio.run(registry.learn(url, "List homes", LISTING_HTML, LLM_DATA, "model"))
+    asyncio.run(registry.record(url, "List homes", ok=False))
+    asyncio.run(registry.record(url, "List homes", ok=True))
+    assert asyncio.run(registry.record(url, "List homes", ok=False)) is True
+
+
+def test_rejected_schema_is_not_stored_and_template_cools_down(registry, schema_llm):
+    schema_llm.schema = WRONG_SCHEMA
+    url = "https://example.com/homes"
+    assert not asyncio.run(registry.learn(url, "List homes", LISTING_HTML, LLM_DATA, "model"))
+    assert not asyncio.run(registry.learn(url, "List homes", LISTING_HTML, LLM_DATA, "model"))
+    assert schema_llm.calls == 1
+    assert asyncio.run(registry.get(url, "List homes")) is None
+    assert registry.stats()["cooling_down"] == 1
+
+
+def test_unusable_llm_data_is_not_learned_from(registry, schema_llm):
+    assert not asyncio.run(registry.learn("https://example.com/homes", "List homes", LISTING_HTML, {"items": []}, "model"))
+    assert schema_llm.calls == 0
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_identical_calls_share_one_run():
+    flight = SingleFlight()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.02)
+        return {"data": runs}
+
+    async def calls():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    results = asyncio.run(calls())
+    assert runs == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+
+    async def calls():
+        return await asyncio.gather(flight.do("a", lambda: asyncio.sleep(0.01, "a")), flight.do("b", lambda: asyncio.sleep(0.01, "b")))
+
+    assert asyncio.run(calls()) == ["a", "b"]
+    assert flight.stats()["started"] == 2
+
+
+def test_exception_reaches_every_waiter():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("scrape failed")
+
+    async def calls():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(calls())
+    assert [type(result) for result in results] == [ValueError] * 3
+
+
+def test_cancelled_waiter_does_not_cancel_work_for_the_others():
+    flight = SingleFlight()
+
+    async def scenario():
+        done = asyncio.Event()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            done.set()
+            return "page"
+
+        leaving = asyncio.create_task(flight.do("key", work))
+        staying = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying, done.is_set()
+
+    assert asyncio.run(scenario()) == ("page", True)
+
+
+def test_work_is_cancelled_once_every_waiter_is_gone():
+    flight = SingleFlight()
+
+    async def scenario():
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        caller = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        # A new caller starts fresh work instead of joining the cancelled call
+        return await flight.do("key", lambda: asyncio.sleep(0, "fresh"))
+
+    assert asyncio.run(scenario()) == "fresh"
+    assert flight.stats()["started"] == 2
+
+
+def test_in_flight_tells_whether_a_call_would_join():
+    flight = SingleFlight()
+
+    async def calls():
+        first = asyncio.create_task(flight.do("key", lambda: asyncio.sleep(0.02, "done")))
+        await asyncio.sleep(0)
+        joining = flight.in_flight("key")
+        await first
+        return joining, flight.in_flight("key")
+
+    assert asyncio.run(calls()) == (True, False)